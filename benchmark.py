@@ -0,0 +1,181 @@
+import argparse
+import importlib
+import datetime as dt
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+# config.py требует токены, для замеров подойдут заглушки
+for name in (
+    "BOT_TOKEN",
+    "OPEN_WEATHER_API_KEY",
+    "NUTRITIONIX_API_APP_ID",
+    "NUTRITIONIX_API_APP_KEY",
+):
+    os.environ.setdefault(name, "benchmark")
+
+
+def _chart_data(points: int):
+    today = dt.date.today()
+    dates = [
+        str(today - dt.timedelta(days=points - 1 - i))
+        for i in range(points)
+    ]
+    values = [random.randint(0, 3000) for _ in range(points)]
+    return dates, values
+
+
+def _measure_chart_backend(backend: str, points: int, repeat: int):
+    # Выполняется в отдельном процессе, чтобы RSS и время импорта
+    # не зависели от другого бэкенда
+    os.environ["CHART_BACKEND"] = backend
+    started = time.perf_counter()
+    import charts
+
+    dates, values = _chart_data(points)
+    charts.create_graph(dates, values, "Вода (мл)", "Прогресс")
+    first_render = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        charts.create_graph(dates, values, "Вода (мл)", "Прогресс")
+    render = (time.perf_counter() - started) / repeat
+
+    print(json.dumps({
+        "backend": backend,
+        "import_and_first_render_ms": round(first_render * 1000, 2),
+        "render_ms": round(render * 1000, 3),
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+        ),
+    }))
+
+
+def bench_charts(args):
+    for backend in ("matplotlib", "svg"):
+        result = subprocess.run(
+            [
+                sys.executable, __file__, "_chart_backend", backend,
+                "--points", str(args.points), "--repeat", str(args.repeat)
+            ],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        print(result.stdout.strip().splitlines()[-1])
+
+
+def _goal_columns(users: int):
+    columns = {
+        "sex": [
+            random.choice(("male", "Мужчина", "Женщина"))
+            for _ in range(users)
+        ],
+        "weight_kg": [random.uniform(45, 120) for _ in range(users)],
+        "height_cm": [random.uniform(150, 200) for _ in range(users)],
+        "age": [random.randint(16, 80) for _ in range(users)],
+        "activity_minutes": [random.randint(0, 180) for _ in range(users)],
+        "calories_goal_handle": [
+            random.choice((None, 0, 2000)) for _ in range(users)
+        ],
+    }
+    temperatures = [random.uniform(-20, 40) for _ in range(users)]
+    return columns, temperatures
+
+
+def bench_goals(args):
+    from goals import calculate_goals_batch
+    from utils import calculate_water_goal, calculate_calories_goal
+
+    columns, temperatures = _goal_columns(args.users)
+
+    started = time.perf_counter()
+    importlib.import_module("numpy")
+    numpy_import = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        water_goals = [
+            calculate_water_goal(sex, weight_kg, activity, temperature)
+            for sex, weight_kg, activity, temperature in zip(
+                columns["sex"],
+                columns["weight_kg"],
+                columns["activity_minutes"],
+                temperatures
+            )
+        ]
+        calories_goals = [
+            handle or calculate_calories_goal(
+                sex, weight_kg, height_cm, age, activity
+            )
+            for sex, weight_kg, height_cm, age, activity, handle in zip(
+                *(columns[name] for name in (
+                    "sex",
+                    "weight_kg",
+                    "height_cm",
+                    "age",
+                    "activity_minutes",
+                    "calories_goal_handle",
+                ))
+            )
+        ]
+    scalar = (time.perf_counter() - started) / args.repeat
+
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        water, calories = calculate_goals_batch(columns, temperatures)
+    vectorized = (time.perf_counter() - started) / args.repeat
+
+    print(json.dumps({
+        "users": args.users,
+        "numpy_import_ms": round(numpy_import * 1000, 2),
+        "scalar_ms": round(scalar * 1000, 2),
+        "vectorized_ms": round(vectorized * 1000, 2),
+        "speedup": round(scalar / vectorized, 1),
+        "parity": (
+            water.tolist() == water_goals
+            and calories.tolist() == calories_goals
+        ),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    charts_parser = subparsers.add_parser(
+        "charts",
+        help="сравнение бэкендов рендера графиков"
+    )
+    charts_parser.add_argument("--points", type=int, default=30)
+    charts_parser.add_argument("--repeat", type=int, default=20)
+    charts_parser.set_defaults(func=bench_charts)
+
+    goals_parser = subparsers.add_parser(
+        "goals",
+        help="скалярный и векторный (NumPy) расчет норм"
+    )
+    goals_parser.add_argument("--users", type=int, default=100000)
+    goals_parser.add_argument("--repeat", type=int, default=5)
+    goals_parser.set_defaults(func=bench_goals)
+
+    backend_parser = subparsers.add_parser("_chart_backend")
+    backend_parser.add_argument("backend")
+    backend_parser.add_argument("--points", type=int, default=30)
+    backend_parser.add_argument("--repeat", type=int, default=20)
+    backend_parser.set_defaults(
+        func=lambda args: _measure_chart_backend(
+            args.backend, args.points, args.repeat
+        )
+    )
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,47 @@
-import asyncio
+import time
 
-from aiogram import Bot, Dispatcher
-from config import TOKEN, logger
-from database import Database
-from handlers import setup_handlers
-from middleware import LoggingMiddleware
+# Момент запуска для замера времени до первого обновления
+STARTED_AT = time.monotonic()
+
+import asyncio  # noqa: E402
+import sys  # noqa: E402
+
+from aiogram import Bot, Dispatcher  # noqa: E402
+from charts import ChartRenderer  # noqa: E402
+from config import (  # noqa: E402
+    TOKEN,
+    BOT_MODE,
+    SHARD_WORKERS,
+    WEBHOOK_WORKERS,
+    SEND_QUEUE_ENABLED,
+    logger
+)
+from database import Database  # noqa: E402
+from fsm_storage import create_storage  # noqa: E402
+from handlers import setup_handlers  # noqa: E402
+from http_client import HttpClient  # noqa: E402
+from jobs import set_shard  # noqa: E402
+from middleware import (  # noqa: E402
+    LoggingMiddleware,
+    StartupTimingMiddleware,
+    UserContextMiddleware
+)
+from rollover import Rollover  # noqa: E402
+from reminders import Reminders  # noqa: E402
+from utils import get_upstream_metrics  # noqa: E402
 
 bot = Bot(token=TOKEN)
-dp = Dispatcher()
+send_queue = None
+if SEND_QUEUE_ENABLED:
+    from send_queue import SendQueue
+
+    send_queue = SendQueue()
+    bot.session.middleware(send_queue)
+dp = Dispatcher(storage=create_storage())
 
+dp.update.outer_middleware(StartupTimingMiddleware(STARTED_AT))
 dp.message.middleware(LoggingMiddleware())
+dp.message.middleware(UserContextMiddleware())
 setup_handlers(dp)
 
 
@@ -17,13 +49,75 @@ async def on_startup():
     # Инициализируем подключение к базе данных и создаём таблицы
     await Database.get_instance()
     logger.info("База данных инициализирована.")
+    # Общий пул соединений к внешним API на все время работы бота
+    HttpClient.get_instance()
+    logger.info("HTTP-клиент инициализирован.")
+    ChartRenderer.start()
+    logger.info("Пул рендера графиков запущен.")
+    Rollover.start()
+    Reminders.start(bot)
 
 
-async def main():
-    await on_startup()
-    logger.info("Bot started")
+async def on_shutdown():
+    logger.info(f"Метрики внешних запросов: {get_upstream_metrics()}")
+    logger.info(f"Метрики рендера графиков: {ChartRenderer.metrics()}")
+    logger.info(f"Отправлено напоминаний: {Reminders.sent}")
+    await Reminders.stop()
+    if send_queue is not None:
+        logger.info(f"Метрики очереди отправки: {send_queue.metrics()}")
+        await send_queue.close()
+    await Rollover.stop()
+    await ChartRenderer.stop()
+    await HttpClient.close()
+    logger.info("HTTP-клиент закрыт.")
+    # Записываем отложенные изменения перед остановкой
+    await Database.close_instance()
+    logger.info("База данных закрыта.")
+
+
+dp.startup.register(on_startup)
+dp.shutdown.register(on_shutdown)
+
+
+async def run_polling():
     await dp.start_polling(bot)
 
 
+def serve_webhook(reuse_port: bool, index: int = 0):
+    from webhook import serve
+
+    if reuse_port:
+        set_shard(index, WEBHOOK_WORKERS)
+    serve(dp, bot, reuse_port)
+
+
+def run_shard_worker(index: int, queue):
+    from sharding import consume_updates, ignore_interrupts
+
+    ignore_interrupts()
+    set_shard(index, SHARD_WORKERS)
+    logger.info(f"Воркер {index} запущен.")
+    asyncio.run(consume_updates(dp, bot, queue))
+
+
+def main():
+    logger.info("Bot started")
+    if BOT_MODE == "webhook":
+        from webhook import run_webhook
+
+        run_webhook(bot, serve_webhook)
+    elif BOT_MODE == "sharded":
+        from sharding import run_sharded
+
+        run_sharded(bot, dp, run_shard_worker)
+    else:
+        asyncio.run(run_polling())
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    if "--import-profile" in sys.argv:
+        from import_profile import profile_imports
+
+        profile_imports()
+    else:
+        main()
@@ -0,0 +1,398 @@
+import asyncio
+import datetime as dt
+import io
+import math
+from concurrent.futures import Executor
+from xml.sax.saxutils import escape
+
+from cache import TTLCache
+from config import (
+    CHART_BACKEND,
+    CHART_WORKERS,
+    CHART_MAX_CONCURRENCY,
+    CHART_CACHE_SIZE
+)
+
+# Расширение файла и MIME-тип для каждого бэкенда
+CHART_FORMATS = {
+    "matplotlib": ("png", "image/png"),
+    "svg": ("svg", "image/svg+xml"),
+}
+
+SVG_WIDTH = 640
+SVG_PANEL_HEIGHT = 360
+SVG_MARGINS = (80, 20, 50, 90)  # слева, справа, сверху, снизу
+SVG_MAX_X_LABELS = 12
+# Дольше этого периода matplotlib подписывает даты не каждый день
+MAX_DAY_TICKS = 14
+
+SERIES_COLORS = ("#1f77b4", "#ff7f0e", "#2ca02c")
+
+# Отрендеренные графики (bytes) или file_id уже загруженных в Telegram,
+# ключ - (user_id, days, metric, date, версия статистики пользователя)
+chart_cache = TTLCache(CHART_CACHE_SIZE)
+
+
+def create_graph(dates: list[str], values: list, ylabel: str, title: str):
+    if CHART_BACKEND == "svg":
+        return create_svg_graph(dates, values, ylabel, title)
+    return create_matplotlib_graph(dates, values, ylabel, title)
+
+
+def _import_matplotlib():
+    # matplotlib импортируется только при первом рендере этим бэкендом.
+    # Figure создается без pyplot: у pyplot глобальная текущая фигура,
+    # а при CHART_WORKERS=0 графики рендерятся в нескольких потоках
+    from matplotlib import dates as mdates
+    from matplotlib.figure import Figure
+
+    return Figure, mdates
+
+
+def _save_matplotlib_figure(fig) -> bytes:
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _date_locator(mdates, dates: list):
+    # Подпись каждого дня только для коротких периодов; недельные
+    # и месячные графики за длинный период размечаются автоматически
+    if dates and (dates[-1] - dates[0]).days <= MAX_DAY_TICKS:
+        return mdates.DayLocator()
+    return mdates.AutoDateLocator()
+
+
+def create_matplotlib_graph(
+    dates: list[str],
+    values: list,
+    ylabel: str,
+    title: str
+):
+    Figure, mdates = _import_matplotlib()
+    dates = [dt.datetime.strptime(date, "%Y-%m-%d") for date in dates]
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(dates, values, marker="o")
+
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+    ax.xaxis.set_major_locator(_date_locator(mdates, dates))
+
+    ax.set_xlabel("Дата")
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+
+    return _save_matplotlib_figure(fig)
+
+
+def create_matplotlib_combined_graph(
+    dates: list[str],
+    water: list,
+    consumed: list,
+    burned: list
+):
+    Figure, mdates = _import_matplotlib()
+    dates = [dt.datetime.strptime(date, "%Y-%m-%d") for date in dates]
+
+    fig = Figure(figsize=(6.4, 7.2))
+    water_ax, calories_ax = fig.subplots(2, 1, sharex=True)
+    water_ax.plot(dates, water, marker="o", color=SERIES_COLORS[0])
+    water_ax.set_ylabel("Вода (мл)")
+    water_ax.set_title("Прогресс выпитой воды")
+
+    calories_ax.plot(
+        dates, consumed,
+        marker="o", color=SERIES_COLORS[1], label="Потреблено"
+    )
+    calories_ax.plot(
+        dates, burned,
+        marker="o", color=SERIES_COLORS[2], label="Сожжено"
+    )
+    calories_ax.set_ylabel("Калории")
+    calories_ax.set_title("Прогресс калорий")
+    calories_ax.legend()
+
+    calories_ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
+    calories_ax.xaxis.set_major_locator(_date_locator(mdates, dates))
+    calories_ax.set_xlabel("Дата")
+    calories_ax.tick_params(axis="x", labelrotation=45)
+    fig.tight_layout()
+
+    return _save_matplotlib_figure(fig)
+
+
+def _nice_ticks(low: float, high: float, count: int = 5) -> list[float]:
+    if high <= low:
+        high = low + 1
+    raw_step = (high - low) / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(
+        factor * magnitude
+        for factor in (1, 2, 2.5, 5, 10)
+        if factor * magnitude >= raw_step
+    )
+    start = math.floor(low / step) * step
+    end = math.ceil(high / step) * step
+    return [start + i * step for i in range(round((end - start) / step) + 1)]
+
+
+def _format_tick(value: float) -> str:
+    return f"{value:g}" if value != int(value) else str(int(value))
+
+
+def _svg_panel(
+    offset: int,
+    dates: list[str],
+    series: list[tuple[str | None, list]],
+    ylabel: str,
+    title: str
+) -> list[str]:
+    # Одна область графика высотой SVG_PANEL_HEIGHT, начиная с offset
+    left, right, top, bottom = SVG_MARGINS
+    top += offset
+    plot_width = SVG_WIDTH - left - right
+    plot_height = SVG_PANEL_HEIGHT - SVG_MARGINS[2] - bottom
+
+    days = [dt.date.fromisoformat(date).toordinal() for date in dates]
+    first_day, last_day = min(days), max(days)
+    all_values = [value for _, values in series for value in values]
+    ticks = _nice_ticks(min(0, min(all_values)), max(all_values))
+    y_low, y_high = ticks[0], ticks[-1]
+
+    def x_pos(day: int) -> float:
+        if last_day == first_day:
+            return left + plot_width / 2
+        return left + (day - first_day) / (last_day - first_day) * plot_width
+
+    def y_pos(value: float) -> float:
+        return top + (y_high - value) / (y_high - y_low) * plot_height
+
+    parts = [
+        f'<text x="{SVG_WIDTH / 2}" y="{top - 25}" text-anchor="middle" '
+        f'font-size="14">{escape(title)}</text>',
+    ]
+
+    for tick in ticks:
+        y = y_pos(tick)
+        parts.append(
+            f'<line x1="{left}" y1="{y:.1f}" x2="{left + plot_width}" '
+            f'y2="{y:.1f}" stroke="#e0e0e0"/>'
+        )
+        parts.append(
+            f'<text x="{left - 6}" y="{y + 4:.1f}" '
+            f'text-anchor="end">{_format_tick(tick)}</text>'
+        )
+
+    label_step = math.ceil(len(dates) / SVG_MAX_X_LABELS)
+    for date, day in list(zip(dates, days))[::label_step]:
+        x = x_pos(day)
+        y = top + plot_height + 14
+        parts.append(
+            f'<text x="{x:.1f}" y="{y}" text-anchor="end" '
+            f'transform="rotate(-45 {x:.1f} {y})">{date}</text>'
+        )
+
+    parts.append(
+        f'<rect x="{left}" y="{top}" width="{plot_width}" '
+        f'height="{plot_height}" fill="none" stroke="black"/>'
+    )
+
+    for i, ((label, values), color) in enumerate(zip(series, SERIES_COLORS)):
+        points = [
+            (x_pos(day), y_pos(value))
+            for day, value in zip(days, values)
+        ]
+        parts.append(
+            f'<polyline fill="none" stroke="{color}" stroke-width="2" '
+            'points="'
+            + " ".join(f"{x:.1f},{y:.1f}" for x, y in points)
+            + '"/>'
+        )
+        parts.extend(
+            f'<circle cx="{x:.1f}" cy="{y:.1f}" r="4" fill="{color}"/>'
+            for x, y in points
+        )
+        if label:
+            y = top + 16 + i * 16
+            parts.append(
+                f'<rect x="{left + 10}" y="{y - 9}" width="10" height="10" '
+                f'fill="{color}"/>'
+            )
+            parts.append(
+                f'<text x="{left + 26}" y="{y}">{escape(label)}</text>'
+            )
+
+    middle = top + plot_height / 2
+    parts.append(
+        f'<text x="20" y="{middle}" text-anchor="middle" '
+        f'transform="rotate(-90 20 {middle})">{escape(ylabel)}</text>'
+    )
+    parts.append(
+        f'<text x="{left + plot_width / 2}" '
+        f'y="{offset + SVG_PANEL_HEIGHT - 10}" '
+        f'text-anchor="middle">Дата</text>'
+    )
+    return parts
+
+
+def _svg_document(panels: list[list[str]]) -> bytes:
+    height = SVG_PANEL_HEIGHT * len(panels)
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{SVG_WIDTH}" '
+        f'height="{height}" font-family="sans-serif" font-size="12">',
+        f'<rect width="{SVG_WIDTH}" height="{height}" fill="white"/>',
+    ]
+    for panel in panels:
+        parts.extend(panel)
+    parts.append("</svg>")
+    return "\n".join(parts).encode()
+
+
+def create_svg_graph(dates: list[str], values: list, ylabel: str, title: str):
+    # Линейный график без matplotlib: несколько десятков SVG-элементов
+    return _svg_document([
+        _svg_panel(0, dates, [(None, values)], ylabel, title)
+    ])
+
+
+def create_svg_combined_graph(
+    dates: list[str],
+    water: list,
+    consumed: list,
+    burned: list
+):
+    return _svg_document([
+        _svg_panel(
+            0, dates,
+            [(None, water)],
+            "Вода (мл)", "Прогресс выпитой воды"
+        ),
+        _svg_panel(
+            SVG_PANEL_HEIGHT, dates,
+            [("Потреблено", consumed), ("Сожжено", burned)],
+            "Калории", "Прогресс калорий"
+        ),
+    ])
+
+
+def _warm_up():
+    # Первый рендер подгружает шрифты и бэкенд, делаем его заранее
+    create_matplotlib_graph(["2025-01-01"], [0], "", "")
+
+
+class ChartRenderer:
+    _executor: Executor | None = None
+    _semaphore: asyncio.Semaphore | None = None
+    _warm_up_task: asyncio.Task | None = None
+    queued = 0
+    rendering = 0
+    rendered = 0
+
+    @classmethod
+    def start(cls):
+        # Рендер matplotlib занимает сотни миллисекунд, поэтому выполняется
+        # в отдельных процессах, а не в цикле событий бота
+        if cls._executor is not None:
+            return
+
+        cls._semaphore = asyncio.Semaphore(CHART_MAX_CONCURRENCY)
+        if CHART_BACKEND == "matplotlib" and CHART_WORKERS > 0:
+            import multiprocessing as mp
+            from concurrent.futures import ProcessPoolExecutor
+
+            cls._executor = ProcessPoolExecutor(
+                max_workers=CHART_WORKERS,
+                mp_context=mp.get_context("spawn")
+            )
+            loop = asyncio.get_running_loop()
+            cls._warm_up_task = asyncio.ensure_future(asyncio.gather(*(
+                loop.run_in_executor(cls._executor, _warm_up)
+                for _ in range(CHART_WORKERS)
+            )))
+
+    @classmethod
+    async def stop(cls):
+        if cls._warm_up_task is not None:
+            cls._warm_up_task.cancel()
+            cls._warm_up_task = None
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+
+    @classmethod
+    async def render_graph(
+        cls,
+        dates: list[str],
+        values: list,
+        ylabel: str,
+        title: str
+    ) -> bytes:
+        if CHART_BACKEND == "svg":
+            # SVG рендерится за доли миллисекунды, пул не нужен
+            cls.rendered += 1
+            return create_svg_graph(dates, values, ylabel, title)
+
+        return await cls._render_in_pool(
+            create_matplotlib_graph,
+            dates, values, ylabel, title
+        )
+
+    @classmethod
+    async def render_combined_graph(
+        cls,
+        dates: list[str],
+        water: list,
+        consumed: list,
+        burned: list
+    ) -> bytes:
+        if CHART_BACKEND == "svg":
+            cls.rendered += 1
+            return create_svg_combined_graph(dates, water, consumed, burned)
+
+        return await cls._render_in_pool(
+            create_matplotlib_combined_graph,
+            dates, water, consumed, burned
+        )
+
+    @classmethod
+    async def _render_in_pool(cls, func, *args) -> bytes:
+        if cls._semaphore is None:
+            cls.start()
+
+        cls.queued += 1
+        started = False
+        try:
+            async with cls._semaphore:
+                cls.queued -= 1
+                started = True
+                cls.rendering += 1
+                try:
+                    # Без пула процессов рендерим в потоке по умолчанию
+                    graph = await asyncio.get_running_loop().run_in_executor(
+                        cls._executor,
+                        func,
+                        *args
+                    )
+                finally:
+                    cls.rendering -= 1
+        finally:
+            if not started:
+                cls.queued -= 1
+
+        cls.rendered += 1
+        return graph
+
+    @classmethod
+    def file_format(cls) -> tuple[str, str]:
+        return CHART_FORMATS[CHART_BACKEND]
+
+    @classmethod
+    def metrics(cls) -> dict:
+        return {
+            "queued": cls.queued,
+            "rendering": cls.rendering,
+            "rendered": cls.rendered,
+        }
@@ -24,6 +24,173 @@ if not NUTRITIONIX_API_APP_KEY:
         "Переменная окружения NUTRITIONIX_API_APP_KEY не установлена!"
     )
 
+# Пул HTTP-соединений к внешним API
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3"))
+WEATHER_TIMEOUT = float(os.getenv("WEATHER_TIMEOUT", "5"))
+NUTRITIONIX_TIMEOUT = float(os.getenv("NUTRITIONIX_TIMEOUT", "10"))
+
+# Кэш температуры по городам (в секундах)
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "3600"))
+WEATHER_CACHE_NEGATIVE_TTL = float(
+    os.getenv("WEATHER_CACHE_NEGATIVE_TTL", "600")
+)
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "1024"))
+
+# Размер кэша продуктов в памяти (поверх таблицы food_cache)
+FOOD_CACHE_SIZE = int(os.getenv("FOOD_CACHE_SIZE", "4096"))
+
+# Кэш переводов: размер в памяти и сохранение в базу данных
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "4096"))
+TRANSLATION_CACHE_PERSIST = os.getenv("TRANSLATION_CACHE_PERSIST", "1") == "1"
+
+# Локальная таблица калорийности и MET (nutrition.py): off - только
+# Nutritionix, first - сначала локальная таблица, fallback - локальная
+# таблица при ошибке Nutritionix или если продукт не найден
+NUTRITION_LOCAL = os.getenv("NUTRITION_LOCAL", "fallback")
+
+# Отложенная запись инкрементов daily_stats (write-behind)
+DB_WRITE_BEHIND = os.getenv("DB_WRITE_BEHIND", "0") == "1"
+DB_FLUSH_INTERVAL_MS = int(os.getenv("DB_FLUSH_INTERVAL_MS", "200"))
+DB_FLUSH_MAX_OPS = int(os.getenv("DB_FLUSH_MAX_OPS", "100"))
+
+# Профиль хранилища SQLite
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Отрицательное значение - размер кэша страниц в КиБ
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-32000"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "4"))
+
+# Размер кэша профилей пользователей в памяти
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+
+# Рендер графиков: бэкенд (matplotlib - PNG, svg - легкий SVG без
+# matplotlib), число процессов (0 - рендер в потоке) и сколько
+# графиков может рендериться одновременно
+CHART_BACKEND = os.getenv("CHART_BACKEND", "matplotlib")
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_MAX_CONCURRENCY = int(os.getenv("CHART_MAX_CONCURRENCY", "4"))
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "1024"))
+# separate - отдельные файлы, combined - все метрики на одном графике,
+# album - отдельные графики одним сообщением (media group)
+CHART_MODE = os.getenv("CHART_MODE", "separate")
+# /progress_graphs за длинный период строится по неделям или месяцам
+# (средние за день) из таблиц сумм weekly_stats/monthly_stats
+CHART_WEEKLY_AFTER_DAYS = int(os.getenv("CHART_WEEKLY_AFTER_DAYS", "60"))
+CHART_MONTHLY_AFTER_DAYS = int(os.getenv("CHART_MONTHLY_AFTER_DAYS", "365"))
+
+# Режим работы: polling, webhook или sharded (фронтовой процесс
+# получает обновления и распределяет их по воркерам по user_id)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+WEBHOOK_BASE_URL = os.getenv("WEBHOOK_BASE_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "1"))
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "4"))
+SHARD_QUEUE_SIZE = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+
+# Хранилище состояний FSM (анкета /set_profile): memory, sqlite
+# (таблица fsm_states, пакетная запись и кэш в памяти) или redis
+# (любой Redis-совместимый сервер по REDIS_URL)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "sqlite")
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+FSM_FLUSH_INTERVAL_MS = int(os.getenv("FSM_FLUSH_INTERVAL_MS", "500"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Очередь исходящих сообщений: общий лимит (сообщений в секунду на бота,
+# делится между процессами), лимит и запас на чат, число повторов
+# после ответа 429 (retry_after)
+SEND_QUEUE_ENABLED = os.getenv("SEND_QUEUE_ENABLED", "1") == "1"
+SEND_RATE_LIMIT = float(os.getenv("SEND_RATE_LIMIT", "30"))
+SEND_CHAT_RATE_LIMIT = float(os.getenv("SEND_CHAT_RATE_LIMIT", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "3"))
+
+# Ночной перевод дня: в полночь (по времени сервера) создает дни всем
+# пользователям, заходившим за последние ROLLOVER_ACTIVE_DAYS дней
+ROLLOVER_ENABLED = os.getenv("ROLLOVER_ENABLED", "1") == "1"
+ROLLOVER_ACTIVE_DAYS = int(os.getenv("ROLLOVER_ACTIVE_DAYS", "7"))
+ROLLOVER_WEATHER_CONCURRENCY = int(
+    os.getenv("ROLLOVER_WEATHER_CONCURRENCY", "10")
+)
+
+# Напоминания пить воду тем, кто отстает от нормы: с REMINDER_START_HOUR
+# до REMINDER_END_HOUR по времени сервера, не чаще раза в
+# REMINDER_INTERVAL_MIN минут, проверка и отправка пачками
+REMINDERS_ENABLED = os.getenv("REMINDERS_ENABLED", "1") == "1"
+REMINDER_INTERVAL_MIN = int(os.getenv("REMINDER_INTERVAL_MIN", "120"))
+REMINDER_START_HOUR = int(os.getenv("REMINDER_START_HOUR", "9"))
+REMINDER_END_HOUR = int(os.getenv("REMINDER_END_HOUR", "21"))
+REMINDER_BATCH_SIZE = int(os.getenv("REMINDER_BATCH_SIZE", "500"))
+
+if BOT_MODE not in ("polling", "webhook", "sharded"):
+    raise ValueError(
+        "Переменная окружения BOT_MODE должна быть "
+        "polling, webhook или sharded!"
+    )
+if SHARD_WORKERS < 1:
+    raise ValueError(
+        "Переменная окружения SHARD_WORKERS должна быть не меньше 1!"
+    )
+if FSM_STORAGE not in ("memory", "sqlite", "redis"):
+    raise ValueError(
+        "Переменная окружения FSM_STORAGE должна быть "
+        "memory, sqlite или redis!"
+    )
+# Состояния FSM должны быть общими для всех процессов
+if FSM_STORAGE == "memory" and (
+    BOT_MODE == "sharded"
+    or BOT_MODE == "webhook" and WEBHOOK_WORKERS > 1
+):
+    FSM_STORAGE = "sqlite"
+# Обновления одного пользователя могут попасть в разные процессы,
+# поэтому кэши и отложенные записи, зависящие от записей в базу,
+# в этом режиме отключаются
+if BOT_MODE == "webhook" and WEBHOOK_WORKERS > 1:
+    PROFILE_CACHE_SIZE = 0
+    CHART_CACHE_SIZE = 0
+    FSM_CACHE_SIZE = 0
+    DB_WRITE_BEHIND = False
+
+if SEND_RATE_LIMIT <= 0 or SEND_CHAT_RATE_LIMIT <= 0 or SEND_CHAT_BURST < 1:
+    raise ValueError(
+        "Переменные окружения SEND_RATE_LIMIT и SEND_CHAT_RATE_LIMIT "
+        "должны быть больше 0, SEND_CHAT_BURST - не меньше 1!"
+    )
+if REMINDER_INTERVAL_MIN < 1 or REMINDER_BATCH_SIZE < 1:
+    raise ValueError(
+        "Переменные окружения REMINDER_INTERVAL_MIN и REMINDER_BATCH_SIZE "
+        "должны быть не меньше 1!"
+    )
+if not 0 <= REMINDER_START_HOUR < REMINDER_END_HOUR <= 24:
+    raise ValueError(
+        "Переменные окружения REMINDER_START_HOUR и REMINDER_END_HOUR "
+        "должны задавать часы 0-24, начало раньше конца!"
+    )
+if NUTRITION_LOCAL not in ("off", "first", "fallback"):
+    raise ValueError(
+        "Переменная окружения NUTRITION_LOCAL должна быть "
+        "off, first или fallback!"
+    )
+if CHART_BACKEND not in ("matplotlib", "svg"):
+    raise ValueError(
+        "Переменная окружения CHART_BACKEND должна быть matplotlib или svg!"
+    )
+if CHART_MODE not in ("separate", "combined", "album"):
+    raise ValueError(
+        "Переменная окружения CHART_MODE должна быть "
+        "separate, combined или album!"
+    )
+
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 formatter = logging.Formatter(
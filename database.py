@@ -1,7 +1,133 @@
 import asyncio
+import contextlib
 import datetime as dt
+import json
+from dataclasses import dataclass
+
 import aiosqlite
 
+from cache import TTLCache, MISSING
+from config import (
+    DB_WRITE_BEHIND,
+    DB_FLUSH_INTERVAL_MS,
+    DB_FLUSH_MAX_OPS,
+    DB_JOURNAL_MODE,
+    DB_SYNCHRONOUS,
+    DB_MMAP_SIZE,
+    DB_CACHE_SIZE,
+    DB_BUSY_TIMEOUT_MS,
+    DB_READ_POOL_SIZE,
+    PROFILE_CACHE_SIZE,
+    logger
+)
+
+USER_COLUMNS = (
+    "user_id",
+    "sex",
+    "weight_kg",
+    "height_cm",
+    "age",
+    "activity_minutes",
+    "city",
+    "calories_goal_handle",
+)
+
+
+@dataclass(slots=True, frozen=True)
+class UserProfile:
+    user_id: int
+    sex: str
+    weight_kg: float
+    height_cm: float
+    age: int
+    activity_minutes: int
+    city: str
+    calories_goal_handle: int
+
+    @classmethod
+    def from_row(cls, row) -> "UserProfile":
+        return cls(*(row[column] for column in USER_COLUMNS))
+
+
+LOG_ENTRY_COLUMNS = (
+    "id",
+    "user_id",
+    "date",
+    "ts",
+    "kind",
+    "amount",
+    "query",
+    "extra_water",
+)
+
+DAILY_STATS_COLUMNS = (
+    "user_id",
+    "date",
+    "temperature",
+    "water_goal",
+    "calories_goal",
+    "logged_water",
+    "logged_calories",
+    "burned_calories",
+)
+
+
+# Поле daily_stats, в которое идет сумма записей каждого вида
+LOG_ENTRY_FIELDS = {
+    "water": "logged_water",
+    "food": "logged_calories",
+    "workout": "burned_calories",
+}
+
+
+EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+
+def epoch_day(date: dt.date) -> int:
+    return date.toordinal() - EPOCH_ORDINAL
+
+
+# Недельные (week - эпохальный день понедельника) и месячные
+# (month - год * 12 + месяц - 1) суммы daily_stats, которые
+# поддерживают триггеры: ключ в SQL, ключ в Python, дата начала периода
+ROLLUPS = {
+    "weekly_stats": (
+        "week",
+        "{day} - ({day} + 3) % 7",
+        lambda date: epoch_day(date) - (epoch_day(date) + 3) % 7,
+        "date({key} * 86400, 'unixepoch')",
+    ),
+    "monthly_stats": (
+        "month",
+        "CAST(strftime('%Y', {date}) AS INTEGER) * 12"
+        " + CAST(strftime('%m', {date}) AS INTEGER) - 1",
+        lambda date: date.year * 12 + date.month - 1,
+        "printf('%04d-%02d-01', {key} / 12, {key} % 12 + 1)",
+    ),
+}
+ROLLUP_FIELDS = (
+    "water_goal",
+    "calories_goal",
+    "logged_water",
+    "logged_calories",
+    "burned_calories",
+)
+SERIES_COLUMNS = (
+    "date",
+    "logged_water",
+    "logged_calories",
+    "burned_calories",
+)
+
+
+def _epoch_day_sql(date: str) -> str:
+    return f"CAST(julianday({date}) - 2440587.5 AS INTEGER)"
+
+
+def _rollup_key_sql(table: str, date: str) -> str:
+    _, key_sql, _, _ = ROLLUPS[table]
+    return key_sql.format(day=_epoch_day_sql(date), date=date)
+
 
 class Database:
     _instance = None
@@ -10,14 +136,114 @@ class Database:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.connection: aiosqlite.Connection | None = None
+        # Пул соединений только для чтения, чтобы чтения не ждали
+        # коммитов соединения-писателя
+        self._readers: list[aiosqlite.Connection] = []
+        self._free_readers: asyncio.Queue | None = None
+        # Профили меняются только через /set_profile и /set_weight
+        self._profiles = TTLCache(PROFILE_CACHE_SIZE)
+        # Версии daily_stats по пользователям для инвалидации кэша графиков
+        self._stats_versions: dict[int, int] = {}
+        # Отложенные инкременты (user_id, date, field) -> delta
+        self._pending_deltas: dict[tuple[int, str, str], float] = {}
+        # Инкременты, которые сейчас записываются в базу
+        self._flushing_deltas: dict[tuple[int, str, str], float] = {}
+        self._pending_ops = 0
+        # Отложенные строки log_entries, пишутся вместе с инкрементами
+        self._pending_entries: list[tuple] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
 
     async def connect(self):
         if self.connection is None:
             self.connection = await aiosqlite.connect(self.db_path)
             self.connection.row_factory = aiosqlite.Row
+            await self.connection.execute(
+                f"PRAGMA journal_mode = {DB_JOURNAL_MODE}"
+            )
+            await self.connection.execute(
+                f"PRAGMA synchronous = {DB_SYNCHRONOUS}"
+            )
+            # INSERT OR REPLACE удаляет старую строку daily_stats; без
+            # рекурсивных триггеров удаление не вызывает триггеры сумм
+            # weekly_stats/monthly_stats и они считаются дважды
+            await self.connection.execute("PRAGMA recursive_triggers = ON")
+            await self._configure_connection(self.connection)
             await self.init_db()
+            await self._open_readers()
+            if DB_WRITE_BEHIND:
+                self._flush_task = asyncio.create_task(
+                    self._flush_periodically()
+                )
         return self.connection
 
+    async def _configure_connection(self, connection: aiosqlite.Connection):
+        await connection.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+        await connection.execute(f"PRAGMA cache_size = {DB_CACHE_SIZE}")
+        await connection.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+
+    async def _open_readers(self):
+        # Отдельные читатели имеют смысл только для файла в режиме WAL
+        if (
+            DB_READ_POOL_SIZE <= 0
+            or self.db_path == ":memory:"
+            or DB_JOURNAL_MODE.upper() != "WAL"
+        ):
+            return
+
+        self._free_readers = asyncio.Queue()
+        for _ in range(DB_READ_POOL_SIZE):
+            reader = await aiosqlite.connect(
+                f"file:{self.db_path}?mode=ro",
+                uri=True
+            )
+            reader.row_factory = aiosqlite.Row
+            await self._configure_connection(reader)
+            self._readers.append(reader)
+            self._free_readers.put_nowait(reader)
+
+    @contextlib.asynccontextmanager
+    async def _reader(self):
+        if self._free_readers is None:
+            yield self.connection
+            return
+
+        reader = await self._free_readers.get()
+        try:
+            yield reader
+        finally:
+            self._free_readers.put_nowait(reader)
+
+    async def _fetchone(self, query: str, params: tuple):
+        async with self._reader() as connection:
+            cursor = await connection.execute(query, params)
+            row = await cursor.fetchone()
+            await cursor.close()
+            return row
+
+    async def _fetchall(self, query: str, params: tuple):
+        async with self._reader() as connection:
+            cursor = await connection.execute(query, params)
+            rows = await cursor.fetchall()
+            await cursor.close()
+            return rows
+
+    async def close(self):
+        if self._flush_task is not None:
+            # Дожидаемся отмены, чтобы прерванный сброс вернул
+            # инкременты в очередь до финальной записи
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        for reader in self._readers:
+            await reader.close()
+        self._readers = []
+        self._free_readers = None
+        if self.connection is not None:
+            await self.flush()
+            await self.connection.close()
+            self.connection = None
+
     async def init_db(self):
         await self.connection.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -45,8 +271,161 @@ class Database:
                 FOREIGN KEY (user_id) REFERENCES users(user_id)
             );
         """)
+        await self._migrate_day_keys()
+        await self._create_rollups()
+        # Частичный индекс только по дням с невыполненной нормой воды:
+        # напоминания читают его, не просматривая всю daily_stats
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS daily_stats_water_behind
+            ON daily_stats (date, user_id)
+            WHERE logged_water < water_goal;
+        """)
+        # Журнал записей /log_water, /log_food, /log_workout: daily_stats
+        # хранит их суммы и меняется в той же транзакции
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS log_entries (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                date TEXT NOT NULL,
+                ts TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                amount REAL NOT NULL,
+                query TEXT,
+                extra_water INTEGER NOT NULL DEFAULT 0
+            );
+        """)
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS log_entries_user_date
+            ON log_entries (user_id, date, id);
+        """)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS food_cache (
+                query TEXT PRIMARY KEY,
+                info TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            );
+        """)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS fsm_states (
+                key TEXT PRIMARY KEY,
+                state TEXT,
+                data TEXT NOT NULL DEFAULT '{}'
+            );
+        """)
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                query TEXT PRIMARY KEY,
+                translation TEXT NOT NULL
+            );
+        """)
         await self.connection.commit()
 
+    async def _migrate_day_keys(self):
+        # Целочисленный ключ дня (дни от 1970-01-01) для диапазонных
+        # запросов по индексу вместо сравнения TEXT-дат
+        cursor = await self.connection.execute(
+            "PRAGMA table_info(daily_stats)"
+        )
+        columns = [row["name"] for row in await cursor.fetchall()]
+        await cursor.close()
+        if "day" not in columns:
+            await self.connection.execute(
+                "ALTER TABLE daily_stats ADD COLUMN day INTEGER"
+            )
+            await self.connection.execute(
+                f"UPDATE daily_stats SET day = {_epoch_day_sql('date')}"
+            )
+        await self.connection.execute("""
+            CREATE INDEX IF NOT EXISTS daily_stats_user_day
+            ON daily_stats (user_id, day);
+        """)
+        await self.connection.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS daily_stats_day
+            AFTER INSERT ON daily_stats WHEN NEW.day IS NULL
+            BEGIN
+                UPDATE daily_stats SET day = {_epoch_day_sql('NEW.date')}
+                WHERE user_id = NEW.user_id AND date = NEW.date;
+            END;
+        """)
+
+    async def _create_rollups(self):
+        fields = ", ".join(ROLLUP_FIELDS)
+        for table, (key, *_) in ROLLUPS.items():
+            cursor = await self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                "AND name = ?",
+                (table,)
+            )
+            exists = await cursor.fetchone() is not None
+            await cursor.close()
+
+            await self.connection.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    user_id INTEGER,
+                    {key} INTEGER,
+                    days INTEGER NOT NULL DEFAULT 0,
+                    {", ".join(f"{f} REAL DEFAULT 0" for f in ROLLUP_FIELDS)},
+                    PRIMARY KEY (user_id, {key})
+                );
+            """)
+            if not exists:
+                # Первое создание: заполняем по уже накопленным дням
+                await self.connection.execute(f"""
+                    INSERT INTO {table} (user_id, {key}, days, {fields})
+                    SELECT user_id, {_rollup_key_sql(table, 'date')},
+                        COUNT(*),
+                        {", ".join(f"SUM({f})" for f in ROLLUP_FIELDS)}
+                    FROM daily_stats
+                    GROUP BY 1, 2
+                """)
+
+            # Триггеры поддерживают суммы в той же транзакции,
+            # что и изменение daily_stats
+            new_key = _rollup_key_sql(table, "NEW.date")
+            old_key = _rollup_key_sql(table, "OLD.date")
+            await self.connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_insert
+                AFTER INSERT ON daily_stats
+                BEGIN
+                    INSERT INTO {table} (user_id, {key}, days, {fields})
+                    VALUES (
+                        NEW.user_id, {new_key}, 1,
+                        {", ".join(f"NEW.{f}" for f in ROLLUP_FIELDS)}
+                    )
+                    ON CONFLICT (user_id, {key}) DO UPDATE SET
+                        days = days + 1,
+                        {", ".join(
+                            f"{f} = {f} + excluded.{f}"
+                            for f in ROLLUP_FIELDS
+                        )};
+                END;
+            """)
+            await self.connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_update
+                AFTER UPDATE OF {fields} ON daily_stats
+                BEGIN
+                    UPDATE {table} SET
+                        {", ".join(
+                            f"{f} = {f} + NEW.{f} - OLD.{f}"
+                            for f in ROLLUP_FIELDS
+                        )}
+                    WHERE user_id = NEW.user_id AND {key} = {new_key};
+                END;
+            """)
+            await self.connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_delete
+                AFTER DELETE ON daily_stats
+                BEGIN
+                    UPDATE {table} SET
+                        days = days - 1,
+                        {", ".join(
+                            f"{f} = {f} - OLD.{f}"
+                            for f in ROLLUP_FIELDS
+                        )}
+                    WHERE user_id = OLD.user_id AND {key} = {old_key};
+                END;
+            """)
+
     @classmethod
     async def get_instance(cls, db_path: str = "database.db"):
         async with cls._lock:
@@ -55,6 +434,13 @@ class Database:
                 await cls._instance.connect()
             return cls._instance
 
+    @classmethod
+    async def close_instance(cls):
+        async with cls._lock:
+            if cls._instance is not None:
+                await cls._instance.close()
+                cls._instance = None
+
     async def create_profile(
         self,
         user_id: int, sex: str, weight_kg: float,
@@ -82,6 +468,7 @@ class Database:
             )
         )
         await self.connection.commit()
+        self._profiles.pop(user_id)
 
     async def create_day(
         self,
@@ -107,20 +494,267 @@ class Database:
             )
         )
         await self.connection.commit()
+        self._touch_stats(user_id)
+
+    async def create_days(self, rows: list[tuple]):
+        # Массовое создание дней (user_id, date, temperature, water_goal,
+        # calories_goal) одной транзакцией; существующие дни не меняются
+        try:
+            await self.connection.executemany(
+                """
+                INSERT OR IGNORE INTO daily_stats (
+                    user_id,
+                    date,
+                    temperature,
+                    water_goal,
+                    calories_goal
+                )
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                rows
+            )
+            await self.connection.commit()
+        except Exception:
+            await self.connection.rollback()
+            raise
+        for row in rows:
+            self._touch_stats(row[0])
 
-    async def update_day_field(
+    async def add_log_entry(
         self,
         user_id: int, date: str,
-        field: str, increment: int
+        kind: str, amount: float,
+        query: str | None = None,
+        extra_water: int = 0
     ):
-        await self.connection.execute(
-            f"""
-            UPDATE daily_stats SET {field} = {field} + ?
+        # Запись в журнал и инкремент суммы за день (и нормы воды
+        # для тренировки) одной транзакцией
+        entry = (
+            user_id, date,
+            dt.datetime.now().isoformat(timespec="seconds"),
+            kind, amount, query, extra_water
+        )
+        increments = [(LOG_ENTRY_FIELDS[kind], amount)]
+        if extra_water:
+            increments.append(("water_goal", extra_water))
+
+        self._touch_stats(user_id)
+        if DB_WRITE_BEHIND:
+            self._pending_entries.append(entry)
+            for field, increment in increments:
+                self._add_pending(user_id, date, field, increment)
+            await self._count_pending_op()
+            return
+
+        try:
+            await self._insert_log_entries([entry])
+            for field, increment in increments:
+                await self.connection.execute(
+                    f"""
+                    UPDATE daily_stats SET {field} = {field} + ?
+                    WHERE user_id = ? AND date = ?
+                    """,
+                    (increment, user_id, date)
+                )
+            await self.connection.commit()
+        except Exception:
+            await self.connection.rollback()
+            raise
+
+    async def _insert_log_entries(self, entries: list[tuple]):
+        await self.connection.executemany(
+            """
+            INSERT INTO log_entries (
+                user_id, date, ts, kind, amount, query, extra_water
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            entries
+        )
+
+    async def undo_last_entry(self, user_id: int, date: str) -> dict | None:
+        # Удаляет последнюю запись дня и вычитает ее из daily_stats
+        # одной транзакцией; возвращает удаленную запись
+        await self.flush()
+        cursor = await self.connection.execute(
+            """
+            SELECT * FROM log_entries
             WHERE user_id = ? AND date = ?
+            ORDER BY id DESC LIMIT 1
             """,
-            (increment, user_id, date)
+            (user_id, date)
         )
-        await self.connection.commit()
+        row = await cursor.fetchone()
+        await cursor.close()
+        if row is None:
+            return None
+
+        field = LOG_ENTRY_FIELDS[row["kind"]]
+        try:
+            await self.connection.execute(
+                "DELETE FROM log_entries WHERE id = ?",
+                (row["id"],)
+            )
+            await self.connection.execute(
+                f"""
+                UPDATE daily_stats SET
+                    {field} = {field} - ?,
+                    water_goal = water_goal - ?
+                WHERE user_id = ? AND date = ?
+                """,
+                (row["amount"], row["extra_water"], user_id, date)
+            )
+            await self.connection.commit()
+        except Exception:
+            await self.connection.rollback()
+            raise
+        self._touch_stats(user_id)
+        return dict(row)
+
+    async def get_log_entries(
+        self,
+        user_id: int,
+        date: str,
+        limit: int
+    ) -> list[dict]:
+        # Последние записи дня, включая еще не записанные в базу
+        pending = [
+            dict(zip(LOG_ENTRY_COLUMNS[1:], entry), id=None)
+            for entry in self._pending_entries
+            if entry[0] == user_id and entry[1] == date
+        ]
+        rows = await self._fetchall(
+            """
+            SELECT * FROM log_entries
+            WHERE user_id = ? AND date = ?
+            ORDER BY id DESC LIMIT ?
+            """,
+            (user_id, date, limit)
+        )
+        entries = [dict(row) for row in reversed(rows)] + pending
+        return entries[-limit:]
+
+    async def update_day_goals(self, rows: list[tuple]):
+        # Пакетная запись (water_goal, calories_goal, user_id, date)
+        try:
+            await self.connection.executemany(
+                """
+                UPDATE daily_stats SET water_goal = ?, calories_goal = ?
+                WHERE user_id = ? AND date = ?
+                """,
+                rows
+            )
+            await self.connection.commit()
+        except Exception:
+            await self.connection.rollback()
+            raise
+        for row in rows:
+            self._touch_stats(row[2])
+
+    def _add_pending(
+        self,
+        user_id: int, date: str,
+        field: str, increment: float
+    ):
+        key = (user_id, date, field)
+        self._pending_deltas[key] = (
+            self._pending_deltas.get(key, 0) + increment
+        )
+
+    async def _count_pending_op(self):
+        self._pending_ops += 1
+        if self._pending_ops >= DB_FLUSH_MAX_OPS:
+            await self.flush()
+
+    def _touch_stats(self, user_id: int):
+        self._stats_versions[user_id] = (
+            self._stats_versions.get(user_id, 0) + 1
+        )
+
+    def get_stats_version(self, user_id: int) -> int:
+        return self._stats_versions.get(user_id, 0)
+
+    async def flush(self):
+        # Записывает накопленные инкременты одной транзакцией
+        async with self._flush_lock:
+            if not self._pending_deltas and not self._pending_entries:
+                return
+
+            self._flushing_deltas = self._pending_deltas
+            self._pending_deltas = {}
+            self._pending_ops = 0
+            entries = self._pending_entries
+            self._pending_entries = []
+
+            by_field: dict[str, list[tuple]] = {}
+            for (user_id, date, field), delta in self._flushing_deltas.items():
+                by_field.setdefault(field, []).append((delta, user_id, date))
+
+            write = asyncio.ensure_future(
+                self._write_pending(entries, by_field)
+            )
+            try:
+                await asyncio.shield(write)
+            except BaseException:
+                # Отмена (например, при close) не прерывает начатую
+                # транзакцию: дожидаемся ее, чтобы не потерять инкременты
+                # и не вернуть в очередь уже записанные
+                await asyncio.wait([write])
+                if write.exception() is not None:
+                    for key, delta in self._flushing_deltas.items():
+                        self._pending_deltas[key] = (
+                            self._pending_deltas.get(key, 0) + delta
+                        )
+                    self._pending_entries = entries + self._pending_entries
+                raise
+            finally:
+                self._flushing_deltas = {}
+
+    async def _write_pending(
+        self,
+        entries: list[tuple],
+        by_field: dict[str, list[tuple]]
+    ):
+        try:
+            await self._insert_log_entries(entries)
+            for field, params in by_field.items():
+                await self.connection.executemany(
+                    f"""
+                    UPDATE daily_stats SET {field} = {field} + ?
+                    WHERE user_id = ? AND date = ?
+                    """,
+                    params
+                )
+            await self.connection.commit()
+        except Exception:
+            await self.connection.rollback()
+            raise
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(DB_FLUSH_INTERVAL_MS / 1000)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Не удалось записать отложенные изменения")
+
+    def _apply_pending(
+        self,
+        row: aiosqlite.Row | dict | None
+    ) -> aiosqlite.Row | dict | None:
+        # Добавляет к строке daily_stats еще не записанные инкременты,
+        # чтобы чтение видело собственные записи
+        if row is None:
+            return None
+        if not self._pending_deltas and not self._flushing_deltas:
+            return row
+
+        stats = dict(row)
+        for deltas in (self._flushing_deltas, self._pending_deltas):
+            for (user_id, date, field), delta in deltas.items():
+                if user_id == stats["user_id"] and date == stats["date"]:
+                    stats[field] += delta
+        return stats
 
     async def update_user_weight(self, user_id: int, weight_kg: float):
         await self.connection.execute(
@@ -128,41 +762,324 @@ class Database:
             (weight_kg, user_id)
         )
         await self.connection.commit()
+        self._profiles.pop(user_id)
 
-    async def get_user(self, user_id: int) -> aiosqlite.Row | None:
-        cursor = await self.connection.execute(
+    async def save_foods_info(self, foods: dict[str, dict]):
+        await self.connection.executemany(
+            """
+            INSERT OR REPLACE INTO food_cache (query, info, updated_at)
+            VALUES (?, ?, ?)
+            """,
+            [
+                (
+                    query,
+                    json.dumps(info, ensure_ascii=False),
+                    str(dt.date.today())
+                )
+                for query, info in foods.items()
+            ]
+        )
+        await self.connection.commit()
+
+    async def get_foods_info(self, queries: tuple[str, ...]) -> dict:
+        rows = await self._fetchall(
+            f"""
+            SELECT query, info FROM food_cache
+            WHERE query IN ({", ".join("?" * len(queries))})
+            """,
+            queries
+        )
+        return {row["query"]: json.loads(row["info"]) for row in rows}
+
+    async def save_translation(self, query: str, translation: str):
+        await self.connection.execute(
+            """
+            INSERT OR REPLACE INTO translations (query, translation)
+            VALUES (?, ?)
+            """,
+            (query, translation)
+        )
+        await self.connection.commit()
+
+    async def get_translation(self, query: str) -> str | None:
+        row = await self._fetchone(
+            "SELECT translation FROM translations WHERE query = ?",
+            (query,)
+        )
+        return row["translation"] if row else None
+
+    async def set_fsm_state(self, key: str, state: str | None):
+        await self.connection.execute(
+            """
+            INSERT INTO fsm_states (key, state) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET state = excluded.state
+            """,
+            (key, state)
+        )
+        await self._delete_empty_fsm_record(key)
+        await self.connection.commit()
+
+    async def set_fsm_data(self, key: str, data: str):
+        await self.connection.execute(
+            """
+            INSERT INTO fsm_states (key, data) VALUES (?, ?)
+            ON CONFLICT (key) DO UPDATE SET data = excluded.data
+            """,
+            (key, data)
+        )
+        await self._delete_empty_fsm_record(key)
+        await self.connection.commit()
+
+    async def _delete_empty_fsm_record(self, key: str):
+        # Запись после state.clear() не хранится, как и в save_fsm_records
+        await self.connection.execute(
+            """
+            DELETE FROM fsm_states
+            WHERE key = ? AND state IS NULL AND data = '{}'
+            """,
+            (key,)
+        )
+
+    async def save_fsm_records(self, records: list[tuple]):
+        # Пакетная запись (key, state, data) одной транзакцией;
+        # пустые записи (после state.clear()) удаляются
+        try:
+            await self.connection.executemany(
+                """
+                INSERT INTO fsm_states (key, state, data) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    state = excluded.state,
+                    data = excluded.data
+                """,
+                records
+            )
+            await self.connection.execute(
+                "DELETE FROM fsm_states WHERE state IS NULL AND data = '{}'"
+            )
+            await self.connection.commit()
+        except Exception:
+            await self.connection.rollback()
+            raise
+
+    async def get_fsm_record(self, key: str) -> aiosqlite.Row | None:
+        return await self._fetchone(
+            "SELECT state, data FROM fsm_states WHERE key = ?",
+            (key,)
+        )
+
+    async def get_user(self, user_id: int) -> UserProfile | None:
+        profile = self._profiles.get(user_id)
+        if profile is not MISSING:
+            return profile
+
+        row = await self._fetchone(
             "SELECT * FROM users WHERE user_id = ?",
             (user_id,)
         )
-        row = await cursor.fetchone()
-        await cursor.close()
-        return row
+        if row is None:
+            return None
+
+        profile = UserProfile.from_row(row)
+        self._profiles.set(user_id, profile)
+        return profile
+
+    async def get_users_without_day(
+        self,
+        date: str,
+        active_since: str,
+        shard: int = 0,
+        shards: int = 1
+    ) -> list[UserProfile]:
+        # Пользователи, заходившие с active_since, у которых еще нет
+        # строки daily_stats на date; shard/shards - доля процесса
+        rows = await self._fetchall(
+            """
+            SELECT * FROM users
+            WHERE user_id % ? = ?
+            AND EXISTS (
+                SELECT 1 FROM daily_stats
+                WHERE daily_stats.user_id = users.user_id
+                AND daily_stats.date >= ?
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM daily_stats
+                WHERE daily_stats.user_id = users.user_id
+                AND daily_stats.date = ?
+            )
+            """,
+            (shards, shard, active_since, date)
+        )
+        return [UserProfile.from_row(row) for row in rows]
+
+    async def get_water_behind_page(
+        self,
+        date: str,
+        after_user_id: int,
+        limit: int,
+        shard: int = 0,
+        shards: int = 1
+    ) -> list[int]:
+        # Пользователи доли процесса, не выпившие норму воды за date,
+        # страницами по user_id (по частичному индексу daily_stats)
+        rows = await self._fetchall(
+            """
+            SELECT user_id FROM daily_stats
+            WHERE date = ? AND logged_water < water_goal
+            AND user_id > ? AND user_id % ? = ?
+            ORDER BY user_id LIMIT ?
+            """,
+            (date, after_user_id, shards, shard, limit)
+        )
+        return [row["user_id"] for row in rows]
+
+    async def get_water_behind(
+        self,
+        date: str,
+        user_ids: list[int]
+    ) -> dict[int, tuple[int, int]]:
+        # Из user_ids - те, кто все еще не выпил норму воды за date:
+        # user_id -> (выпито, норма) с учетом отложенных инкрементов
+        if not user_ids:
+            return {}
+
+        rows = await self._fetchall(
+            f"""
+            SELECT user_id, logged_water, water_goal FROM daily_stats
+            WHERE date = ? AND logged_water < water_goal
+            AND user_id IN ({", ".join("?" * len(user_ids))})
+            """,
+            (date, *user_ids)
+        )
+        behind = {}
+        for user_id, logged_water, water_goal in rows:
+            for deltas in (self._flushing_deltas, self._pending_deltas):
+                logged_water += deltas.get((user_id, date, "logged_water"), 0)
+            if logged_water < water_goal:
+                behind[user_id] = (logged_water, water_goal)
+        return behind
+
+    async def get_goal_inputs(self, date: str) -> dict[str, list]:
+        # Столбцы профилей и температуры дня для пакетного пересчета норм
+        columns = USER_COLUMNS + ("temperature", "extra_water")
+        rows = await self._fetchall(
+            f"""
+            SELECT {", ".join(f"u.{column}" for column in USER_COLUMNS)},
+            d.temperature, (
+                SELECT COALESCE(SUM(l.extra_water), 0) FROM log_entries l
+                WHERE l.user_id = d.user_id AND l.date = d.date
+            )
+            FROM daily_stats d
+            JOIN users u ON u.user_id = d.user_id
+            WHERE d.date = ? AND d.temperature IS NOT NULL
+            """,
+            (date,)
+        )
+        return dict(zip(
+            columns,
+            map(list, zip(*rows)) if rows else ([] for _ in columns)
+        ))
+
+    async def get_user_context(
+        self,
+        user_id: int,
+        date: str
+    ) -> tuple[UserProfile | None, dict | None]:
+        # Если профиль уже в кэше, нужна только статистика за день
+        profile = self._profiles.get(user_id)
+        if profile is not MISSING:
+            return profile, await self.get_daily_stats(user_id, date)
+
+        # Иначе профиль и статистика за день одним запросом
+        stats_columns = ", ".join(
+            f"d.{column}" for column in DAILY_STATS_COLUMNS[1:]
+        )
+        row = await self._fetchone(
+            f"""
+            SELECT u.*, {stats_columns}
+            FROM users u
+            LEFT JOIN daily_stats d
+                ON d.user_id = u.user_id AND d.date = ?
+            WHERE u.user_id = ?
+            """,
+            (date, user_id)
+        )
+        if row is None:
+            return None, None
+
+        profile = UserProfile.from_row(row)
+        self._profiles.set(user_id, profile)
+        if row["date"] is None:
+            return profile, None
+
+        daily_stats = {column: row[column] for column in DAILY_STATS_COLUMNS}
+        return profile, self._apply_pending(daily_stats)
 
     async def get_daily_stats(
         self,
         user_id: int,
         date: str
-    ) -> aiosqlite.Row | None:
-        cursor = await self.connection.execute(
+    ) -> aiosqlite.Row | dict | None:
+        row = await self._fetchone(
             "SELECT * FROM daily_stats WHERE user_id = ? AND date = ?",
             (user_id, date)
         )
-        row = await cursor.fetchone()
-        await cursor.close()
-        return row
+        return self._apply_pending(row)
 
-    async def get_last_days_stats(self, user_id: int, last_days_num: int):
+    async def get_stats_series(
+        self,
+        user_id: int,
+        last_days_num: int,
+        granularity: str = "day"
+    ) -> dict[str, list]:
+        # Столбцы date, logged_water, logged_calories, burned_calories
+        # за последние last_days_num дней, готовые для графика; для week и
+        # month - средние за день по неделям/месяцам из таблиц сумм
         today = dt.date.today()
-        start_date = str(today - dt.timedelta(days=last_days_num - 1))
-        end_date = str(today)
-        cursor = await self.connection.execute(
-            """
-            SELECT * FROM daily_stats
-            WHERE user_id = ? AND date BETWEEN ? AND ?
-            ORDER BY date ASC
-            """,
-            (user_id, start_date, end_date)
-        )
-        rows = await cursor.fetchall()
-        await cursor.close()
-        return rows
+        start_date = today - dt.timedelta(days=last_days_num - 1)
+        if granularity == "day":
+            rows = await self._fetchall(
+                f"""
+                SELECT {", ".join(SERIES_COLUMNS)} FROM daily_stats
+                WHERE user_id = ? AND day BETWEEN ? AND ?
+                ORDER BY day ASC
+                """,
+                (user_id, epoch_day(start_date), epoch_day(today))
+            )
+        else:
+            # Таблицы сумм меняются только при записи в daily_stats
+            await self.flush()
+            table = f"{'weekly' if granularity == 'week' else 'monthly'}_stats"
+            key, _, date_key, date_sql = ROLLUPS[table]
+            rows = await self._fetchall(
+                f"""
+                SELECT {date_sql.format(key=key)},
+                    {", ".join(
+                        f"ROUND(1.0 * {column} / days, 1)"
+                        for column in SERIES_COLUMNS[1:]
+                    )}
+                FROM {table}
+                WHERE user_id = ? AND days > 0
+                AND {key} BETWEEN ? AND ?
+                ORDER BY {key} ASC
+                """,
+                (user_id, date_key(start_date), date_key(today))
+            )
+
+        series = dict(zip(
+            SERIES_COLUMNS,
+            map(list, zip(*rows)) if rows else ([] for _ in SERIES_COLUMNS)
+        ))
+        if granularity == "day":
+            self._apply_pending_series(user_id, series)
+        return series
+
+    def _apply_pending_series(self, user_id: int, series: dict[str, list]):
+        positions = None
+        for deltas in (self._flushing_deltas, self._pending_deltas):
+            for (delta_user_id, date, field), delta in deltas.items():
+                if delta_user_id != user_id or field not in series:
+                    continue
+                if positions is None:
+                    positions = {d: i for i, d in enumerate(series["date"])}
+                if date in positions:
+                    series[field][positions[date]] += delta
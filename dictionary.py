@@ -0,0 +1,188 @@
+import re
+
+# Локальный словарь RU->EN для самых частых продуктов, единиц измерения
+# и видов тренировок. Запросы, полностью покрытые словарем, переводятся
+# без обращения к сети.
+RU_EN_DICTIONARY = {
+    # Продукты
+    "вода": "water",
+    "кофе": "coffee",
+    "латте": "latte",
+    "капучино": "cappuccino",
+    "американо": "americano",
+    "эспрессо": "espresso",
+    "чай": "tea",
+    "зеленый чай": "green tea",
+    "черный чай": "black tea",
+    "молоко": "milk",
+    "кефир": "kefir",
+    "йогурт": "yogurt",
+    "творог": "cottage cheese",
+    "сыр": "cheese",
+    "сметана": "sour cream",
+    "масло": "butter",
+    "сливочное масло": "butter",
+    "оливковое масло": "olive oil",
+    "яйцо": "egg",
+    "яйца": "eggs",
+    "яиц": "eggs",
+    "омлет": "omelette",
+    "хлеб": "bread",
+    "тост": "toast",
+    "батон": "white bread",
+    "булка": "bun",
+    "каша": "porridge",
+    "овсянка": "oatmeal",
+    "овсяная каша": "oatmeal",
+    "гречка": "buckwheat",
+    "гречневая каша": "buckwheat porridge",
+    "рис": "rice",
+    "макароны": "pasta",
+    "паста": "pasta",
+    "картофель": "potato",
+    "картошка": "potato",
+    "картофельное пюре": "mashed potatoes",
+    "пюре": "mashed potatoes",
+    "суп": "soup",
+    "борщ": "borscht",
+    "салат": "salad",
+    "курица": "chicken",
+    "куриная грудка": "chicken breast",
+    "говядина": "beef",
+    "свинина": "pork",
+    "индейка": "turkey",
+    "рыба": "fish",
+    "лосось": "salmon",
+    "тунец": "tuna",
+    "креветки": "shrimp",
+    "котлета": "cutlet",
+    "колбаса": "sausage",
+    "сосиска": "sausage",
+    "пельмени": "dumplings",
+    "пицца": "pizza",
+    "бургер": "burger",
+    "шаурма": "shawarma",
+    "яблоко": "apple",
+    "яблоки": "apples",
+    "банан": "banana",
+    "бананы": "bananas",
+    "апельсин": "orange",
+    "мандарин": "tangerine",
+    "груша": "pear",
+    "виноград": "grapes",
+    "клубника": "strawberries",
+    "помидор": "tomato",
+    "огурец": "cucumber",
+    "морковь": "carrot",
+    "капуста": "cabbage",
+    "авокадо": "avocado",
+    "орехи": "nuts",
+    "грецкие орехи": "walnuts",
+    "миндаль": "almonds",
+    "шоколад": "chocolate",
+    "печенье": "cookies",
+    "торт": "cake",
+    "мороженое": "ice cream",
+    "сахар": "sugar",
+    "мед": "honey",
+    "сок": "juice",
+    "апельсиновый сок": "orange juice",
+    "пиво": "beer",
+    "вино": "wine",
+    "кола": "cola",
+    # Единицы измерения
+    "грамм": "grams",
+    "грамма": "grams",
+    "граммов": "grams",
+    "г": "g",
+    "гр": "g",
+    "килограмм": "kilogram",
+    "кг": "kg",
+    "мл": "ml",
+    "миллилитров": "ml",
+    "литр": "liter",
+    "л": "l",
+    "чашка": "cup",
+    "чашки": "cups",
+    "чашек": "cups",
+    "стакан": "glass",
+    "стакана": "glasses",
+    "стаканов": "glasses",
+    "ложка": "spoon",
+    "столовая ложка": "tablespoon",
+    "чайная ложка": "teaspoon",
+    "тарелка": "plate",
+    "порция": "serving",
+    "порции": "servings",
+    "кусок": "piece",
+    "кусочек": "piece",
+    "ломтик": "slice",
+    "шт": "pieces",
+    "штука": "piece",
+    "штуки": "pieces",
+    "штук": "pieces",
+    "и": "and",
+    # Тренировки
+    "бег": "running",
+    "ходьба": "walking",
+    "быстрая ходьба": "brisk walking",
+    "прогулка": "walking",
+    "плавание": "swimming",
+    "велосипед": "cycling",
+    "велотренажер": "stationary bike",
+    "йога": "yoga",
+    "пилатес": "pilates",
+    "танцы": "dancing",
+    "теннис": "tennis",
+    "футбол": "soccer",
+    "баскетбол": "basketball",
+    "волейбол": "volleyball",
+    "бокс": "boxing",
+    "гребля": "rowing",
+    "лыжи": "skiing",
+    "коньки": "ice skating",
+    "скакалка": "jump rope",
+    "прыжки на скакалке": "jumping rope",
+    "растяжка": "stretching",
+    "силовая тренировка": "weight lifting",
+    "тренажерный зал": "gym workout",
+    "аэробика": "aerobics",
+    "кроссфит": "crossfit",
+    "хайкинг": "hiking",
+    "мин": "min",
+    "минут": "minutes",
+    "минуты": "minutes",
+    "час": "hour",
+    "часа": "hours",
+    "часов": "hours",
+}
+
+_MAX_PHRASE_WORDS = max(len(key.split()) for key in RU_EN_DICTIONARY)
+_NUMBER_RE = re.compile(r"^\d+(?:[.,]\d+)?$")
+
+
+def translate_with_dictionary(query: str) -> str | None:
+    # Переводит запрос только если словарь покрывает все слова,
+    # иначе возвращает None и перевод выполняется через сеть
+    words = query.casefold().replace("ё", "е").split()
+    if not words:
+        return None
+
+    translated = []
+    i = 0
+    while i < len(words):
+        if _NUMBER_RE.match(words[i]):
+            translated.append(words[i].replace(",", "."))
+            i += 1
+            continue
+
+        for size in range(min(_MAX_PHRASE_WORDS, len(words) - i), 0, -1):
+            phrase = " ".join(words[i:i + size])
+            if phrase in RU_EN_DICTIONARY:
+                translated.append(RU_EN_DICTIONARY[phrase])
+                i += size
+                break
+        else:
+            return None
+
+    return " ".join(translated)
@@ -0,0 +1,150 @@
+import asyncio
+import json
+from typing import Any, Mapping
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from cache import TTLCache, MISSING
+from config import (
+    FSM_STORAGE,
+    FSM_CACHE_SIZE,
+    FSM_FLUSH_INTERVAL_MS,
+    REDIS_URL,
+    logger
+)
+from database import Database
+
+
+def _storage_key(key: StorageKey) -> str:
+    return ":".join(
+        str(part) if part is not None else ""
+        for part in (
+            key.bot_id,
+            key.chat_id,
+            key.user_id,
+            key.thread_id,
+            key.business_connection_id,
+            key.destiny,
+        )
+    )
+
+
+def _state_name(state: StateType) -> str | None:
+    return state.state if isinstance(state, State) else state
+
+
+class SQLiteStorage(BaseStorage):
+    # Состояния FSM (анкета Profile) в базе бота: сохраняются при
+    # перезапуске и общие для всех процессов. С кэшем (FSM_CACHE_SIZE > 0)
+    # чтения идут из памяти, а записи копятся и пишутся одной транзакцией
+    # раз в FSM_FLUSH_INTERVAL_MS, чтобы шаг анкеты не ждал записи на диск
+    def __init__(self):
+        self._records = TTLCache(FSM_CACHE_SIZE)
+        self._dirty: dict[str, tuple[str | None, str]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+
+    async def _load(self, key: str) -> tuple[str | None, str]:
+        record = self._dirty.get(key)
+        if record is not None:
+            return record
+
+        record = self._records.get(key)
+        if record is MISSING:
+            db = await Database.get_instance()
+            row = await db.get_fsm_record(key)
+            record = (row["state"], row["data"]) if row else (None, "{}")
+            self._records.set(key, record)
+        return record
+
+    async def _save(self, key: str, state: str | None, data: str):
+        self._records.set(key, (state, data))
+        self._dirty[key] = (state, data)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(FSM_FLUSH_INTERVAL_MS / 1000)
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Не удалось записать состояния FSM")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._dirty:
+                return
+
+            dirty = self._dirty
+            self._dirty = {}
+            db = await Database.get_instance()
+            try:
+                await db.save_fsm_records([
+                    (key, state, data)
+                    for key, (state, data) in dirty.items()
+                ])
+            except BaseException:
+                # Более новые записи того же ключа не перезаписываем
+                self._dirty = {**dirty, **self._dirty}
+                raise
+
+    async def set_state(self, key: StorageKey, state: StateType = None):
+        key = _storage_key(key)
+        if not FSM_CACHE_SIZE:
+            db = await Database.get_instance()
+            await db.set_fsm_state(key, _state_name(state))
+            return
+
+        _, data = await self._load(key)
+        await self._save(key, _state_name(state), data)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        key = _storage_key(key)
+        if not FSM_CACHE_SIZE:
+            db = await Database.get_instance()
+            record = await db.get_fsm_record(key)
+            return record["state"] if record else None
+
+        state, _ = await self._load(key)
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]):
+        key = _storage_key(key)
+        data = json.dumps(dict(data), ensure_ascii=False)
+        if not FSM_CACHE_SIZE:
+            db = await Database.get_instance()
+            await db.set_fsm_data(key, data)
+            return
+
+        state, _ = await self._load(key)
+        await self._save(key, state, data)
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        key = _storage_key(key)
+        if not FSM_CACHE_SIZE:
+            db = await Database.get_instance()
+            record = await db.get_fsm_record(key)
+            return json.loads(record["data"]) if record else {}
+
+        _, data = await self._load(key)
+        return json.loads(data)
+
+    async def close(self):
+        # Вызывается при остановке диспетчера до закрытия базы данных
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+
+
+def create_storage() -> BaseStorage:
+    if FSM_STORAGE == "redis":
+        # redis нужен только для этого хранилища: pip install redis
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        return RedisStorage.from_url(REDIS_URL)
+    if FSM_STORAGE == "sqlite":
+        return SQLiteStorage()
+    return MemoryStorage()
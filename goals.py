@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import datetime as dt
+from itertools import repeat
+from typing import TYPE_CHECKING
+
+from config import logger
+from database import Database
+
+# numpy нужен только для пакетного пересчета и импортируется при
+# первом вызове, чтобы не замедлять запуск бота
+if TYPE_CHECKING:
+    import numpy as np
+
+GOAL_INPUT_COLUMNS = (
+    "sex",
+    "weight_kg",
+    "height_cm",
+    "age",
+    "activity_minutes",
+    "calories_goal_handle",
+)
+
+
+def calculate_goals_batch(
+    columns: dict[str, list],
+    temperatures: list
+) -> tuple["np.ndarray", "np.ndarray"]:
+    # Векторный аналог calculate_water_goal и calculate_calories_goal
+    # (с учетом calories_goal_handle, как в calculate_day_goals) по
+    # столбцам таблицы users; результаты совпадают со скалярными
+    import numpy as np
+
+    male = np.asarray(columns["sex"], dtype=object) == "male"
+    weight_kg = np.asarray(columns["weight_kg"], dtype=np.float64)
+    height_cm = np.asarray(columns["height_cm"], dtype=np.float64)
+    age = np.asarray(columns["age"], dtype=np.int64)
+    activity = np.asarray(columns["activity_minutes"], dtype=np.int64)
+    temperature = np.asarray(temperatures, dtype=np.float64)
+
+    water_goal = weight_kg * 30 + 500 * activity // 30
+    water_goal += 500 * male
+    water_goal += 500 * (temperature > 25)
+    water_goal += 500 * (temperature > 30)
+
+    calories_goal = 10 * weight_kg + 6.25 * height_cm - 5 * age
+    calories_goal += np.where(male, 5, -161)
+    calories_goal += 12 * activity
+    calories_goal = np.trunc(calories_goal).astype(np.int64)
+
+    handle = np.asarray(
+        [value or 0 for value in columns["calories_goal_handle"]],
+        dtype=np.int64
+    )
+    calories_goal = np.where(handle != 0, handle, calories_goal)
+
+    return np.trunc(water_goal).astype(np.int64), calories_goal
+
+
+async def recalculate_day_goals(date: str) -> int:
+    # Пересчитывает нормы дня всем пользователям после изменения формул:
+    # температура берется из daily_stats, к норме воды добавляется
+    # вода за тренировки этого дня из log_entries
+    db = await Database.get_instance()
+    columns = await db.get_goal_inputs(date)
+    if not columns["user_id"]:
+        return 0
+
+    water_goal, calories_goal = calculate_goals_batch(
+        columns,
+        columns["temperature"]
+    )
+    water_goal += columns["extra_water"]
+    await db.update_day_goals(list(zip(
+        water_goal.tolist(),
+        calories_goal.tolist(),
+        columns["user_id"],
+        repeat(date)
+    )))
+    return len(columns["user_id"])
+
+
+async def _recalculate(date: str):
+    try:
+        updated = await recalculate_day_goals(date)
+        logger.info(f"Нормы за {date} пересчитаны: {updated}")
+    finally:
+        await Database.close_instance()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Пакетный пересчет норм воды и калорий"
+    )
+    parser.add_argument(
+        "--date",
+        default=str(dt.date.today()),
+        help="день в формате ГГГГ-ММ-ДД (по умолчанию сегодня)"
+    )
+    args = parser.parse_args()
+    asyncio.run(_recalculate(args.date))
+
+
+if __name__ == "__main__":
+    main()
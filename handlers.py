@@ -1,3 +1,4 @@
+import asyncio
 import datetime as dt
 
 from aiogram import Router
@@ -6,12 +7,19 @@ from aiogram.types import (
     InlineKeyboardMarkup,
     InlineKeyboardButton,
     CallbackQuery,
-    BufferedInputFile
+    BufferedInputFile,
+    InputMediaDocument
 )
 from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 
-from database import Database
+from charts import ChartRenderer, chart_cache
+from config import (
+    CHART_MODE,
+    CHART_WEEKLY_AFTER_DAYS,
+    CHART_MONTHLY_AFTER_DAYS
+)
+from database import Database, UserProfile
 from states import Profile
 from string_constants import (
     START_MSG, HELP_MSG, ENTER_NUM_ERROR_MSG, ENTER_INT_ERROR_MSG,
@@ -21,19 +29,18 @@ from string_constants import (
     PRODUCT_NOT_FOUND_MSG, LOG_WORKOUT_ARGS_ERROR_MSG,
     LOG_WORKOUT_DURATION_ERROR_MSG, WORKOUT_NOT_FOUND_MSG,
     NEW_DAY_ALREADY_BEGUN, CITY_NOT_FOUND_MSG, DATA_FOR_GRAPH_NOT_FOUND_MSG,
-    ENTER_INT_DAYS_ERROR_MSG,
+    ENTER_INT_DAYS_ERROR_MSG, HISTORY_EMPTY_MSG, UNDO_EMPTY_MSG,
 )
 
 from utils import (
     get_current_temperature,
     calculate_water_goal,
     calculate_calories_goal,
-    get_food_info,
+    calculate_day_goals,
+    get_foods_info,
+    split_food_items,
     get_exercise_info,
     translate_text,
-    user_has_profile,
-    new_day_was_begun,
-    create_graph,
 )
 
 router = Router()
@@ -43,6 +50,23 @@ SEX_CHOICES = {
     "female": "Женщина",
 }
 
+PROGRESS_GRAPHS = (
+    (
+        "logged_water",
+        "Вода (мл)",
+        "Прогресс выпитой воды (за последние 7 дней)",
+        "water_graph",
+    ),
+    (
+        "logged_calories",
+        "Калории",
+        "Прогресс потребленных калорий (за последние 7 дней)",
+        "calories_graph",
+    ),
+)
+# Вода, потребленные и сожженные калории на одном изображении
+COMBINED_PROGRESS_GRAPH = ("combined", None, None, "progress_graph")
+
 
 @router.message(Command("start"))
 async def cmd_start(message: Message):
@@ -203,12 +227,17 @@ async def process_calories_goal(message: Message, state: FSMContext):
 
 
 @router.message(Command("log_water"))
-async def log_water(message: Message, command: CommandObject):
+async def log_water(
+    message: Message,
+    command: CommandObject,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
     user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
-    if not await new_day_was_begun(user_id):
+    if daily_stats is None:
         await message.reply(NEW_DAY_NOT_BEGIN)
         return
 
@@ -219,10 +248,10 @@ async def log_water(message: Message, command: CommandObject):
         return
 
     db = await Database.get_instance()
-    await db.update_day_field(
+    await db.add_log_entry(
         user_id,
         str(dt.date.today()),
-        "logged_water",
+        "water",
         amount
     )
 
@@ -230,12 +259,17 @@ async def log_water(message: Message, command: CommandObject):
 
 
 @router.message(Command("log_food"))
-async def log_food(message: Message, command: CommandObject):
+async def log_food(
+    message: Message,
+    command: CommandObject,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
     user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
-    if not await new_day_was_begun(user_id):
+    if daily_stats is None:
         await message.reply(NEW_DAY_NOT_BEGIN)
         return
 
@@ -245,31 +279,51 @@ async def log_food(message: Message, command: CommandObject):
         await message.reply(LOG_FOOD_ARGS_ERROR_MSG)
         return
 
-    product_info = await get_food_info(await translate_text(command.args))
-    if not product_info:
+    # Прием пищи из нескольких продуктов: "2 яйца, тост и кофе"
+    items = split_food_items(command.args)
+    foods = await get_foods_info(
+        await asyncio.gather(*map(translate_text, items))
+    )
+    if not foods:
         await message.reply(PRODUCT_NOT_FOUND_MSG)
         return
 
-    new_calories = product_info["nf_calories"]
+    new_calories = round(sum(food["nf_calories"] for food in foods), 1)
 
     db = await Database.get_instance()
-    await db.update_day_field(
+    await db.add_log_entry(
         user_id,
         str(dt.date.today()),
-        "logged_calories",
-        new_calories
+        "food",
+        new_calories,
+        command.args
     )
 
-    await message.reply(f"Записано: {new_calories} ккал.")
+    if len(foods) == 1:
+        await message.reply(f"Записано: {new_calories} ккал.")
+        return
+
+    lines = [
+        f"{food['food_name']}: {food['nf_calories']} ккал"
+        for food in foods
+    ]
+    await message.reply(
+        "\n".join(lines) + f"\nЗаписано: {new_calories} ккал."
+    )
 
 
 @router.message(Command("log_workout"))
-async def log_workout(message: Message, command: CommandObject):
+async def log_workout(
+    message: Message,
+    command: CommandObject,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
     user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
-    if not await new_day_was_begun(user_id):
+    if daily_stats is None:
         await message.reply(NEW_DAY_NOT_BEGIN)
         return
 
@@ -290,59 +344,51 @@ async def log_workout(message: Message, command: CommandObject):
         await message.reply(LOG_WORKOUT_DURATION_ERROR_MSG)
         return
 
-    db = await Database.get_instance()
-    user_info = await db.get_user(user_id)
-
     exercise_info = await get_exercise_info(
         await translate_text(f"{command.args} мин"),
-        user_info["weight_kg"],
-        user_info["height_cm"],
-        user_info["age"]
+        profile.weight_kg,
+        profile.height_cm,
+        profile.age,
+        profile.sex
     )
     if not exercise_info:
         await message.reply(WORKOUT_NOT_FOUND_MSG)
 
     burned_calories = exercise_info["nf_calories"]
-    await db.update_day_field(
+    extra_water = workout_duration // 30 * 200
+    db = await Database.get_instance()
+    await db.add_log_entry(
         user_id,
         str(dt.date.today()),
-        "burned_calories",
-        burned_calories
+        "workout",
+        burned_calories,
+        command.args,
+        extra_water
     )
 
     msg = (
         f"{workout_type.capitalize()} {workout_duration} мин "
         f"- {burned_calories} ккал."
     )
-    extra_water = workout_duration // 30 * 200
     if extra_water > 0:
-        await db.update_day_field(
-            user_id,
-            str(dt.date.today()),
-            "water_goal",
-            extra_water
-        )
         msg += f" Дополнительно: выпейте {extra_water} мл воды."
 
     await message.reply(msg)
 
 
 @router.message(Command("check_progress"))
-async def check_progress(message: Message):
-    user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+async def check_progress(
+    message: Message,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
-    if not await new_day_was_begun(user_id):
+    if daily_stats is None:
         await message.reply(NEW_DAY_NOT_BEGIN)
         return
 
-    db = await Database.get_instance()
-    daily_stats = await db.get_daily_stats(
-        user_id,
-        str(dt.date.today())
-    )
-
     logged_water = daily_stats["logged_water"]
     water_goal = daily_stats["water_goal"]
     remaining_water = max(water_goal - logged_water, 0)
@@ -364,38 +410,99 @@ async def check_progress(message: Message):
     """)
 
 
-@router.message(Command("new_day"))
-async def new_day(message: Message):
-    user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+LOG_ENTRY_TITLES = {
+    "water": "Вода",
+    "food": "Еда",
+    "workout": "Тренировка",
+}
+LOG_ENTRY_UNITS = {
+    "water": "мл",
+    "food": "ккал",
+    "workout": "ккал",
+}
+HISTORY_LIMIT = 20
+
+
+def format_log_entry(entry: dict) -> str:
+    kind = entry["kind"]
+    line = (
+        f"{entry['ts'][11:16]} {LOG_ENTRY_TITLES[kind]}: "
+        f"{entry['amount']:g} {LOG_ENTRY_UNITS[kind]}"
+    )
+    if entry["query"]:
+        line += f" ({entry['query']})"
+    return line
+
+
+@router.message(Command("history"))
+async def history(
+    message: Message,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
-    if await new_day_was_begun(user_id):
-        await message.reply(NEW_DAY_ALREADY_BEGUN)
+    if daily_stats is None:
+        await message.reply(NEW_DAY_NOT_BEGIN)
         return
 
     db = await Database.get_instance()
-    user_info = await db.get_user(user_id)
-
-    curr_temp = await get_current_temperature(user_info["city"])
-    water_goal = calculate_water_goal(
-        user_info["sex"],
-        user_info["weight_kg"],
-        user_info["activity_minutes"],
-        curr_temp
+    entries = await db.get_log_entries(
+        message.from_user.id,
+        str(dt.date.today()),
+        HISTORY_LIMIT
     )
+    if not entries:
+        await message.reply(HISTORY_EMPTY_MSG)
+        return
 
-    calories_goal = (
-        user_info["calories_goal_handle"]
-        or calculate_calories_goal(
-            user_info["sex"],
-            user_info["weight_kg"],
-            user_info["height_cm"],
-            user_info["age"],
-            user_info["activity_minutes"],
-        )
+    await message.reply("\n".join(map(format_log_entry, entries)))
+
+
+@router.message(Command("undo"))
+async def undo(
+    message: Message,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
+    if profile is None:
+        await message.reply(PROFILE_NOT_EXISTS_MSG)
+        return
+    if daily_stats is None:
+        await message.reply(NEW_DAY_NOT_BEGIN)
+        return
+
+    db = await Database.get_instance()
+    entry = await db.undo_last_entry(
+        message.from_user.id,
+        str(dt.date.today())
     )
+    if entry is None:
+        await message.reply(UNDO_EMPTY_MSG)
+        return
+
+    await message.reply(f"Отменено: {format_log_entry(entry)}")
+
+
+@router.message(Command("new_day"))
+async def new_day(
+    message: Message,
+    profile: UserProfile | None,
+    daily_stats: dict | None
+):
+    user_id = message.from_user.id
+    if profile is None:
+        await message.reply(PROFILE_NOT_EXISTS_MSG)
+        return
+    if daily_stats is not None:
+        await message.reply(NEW_DAY_ALREADY_BEGUN)
+        return
+
+    curr_temp = await get_current_temperature(profile.city)
+    water_goal, calories_goal = calculate_day_goals(profile, curr_temp)
 
+    db = await Database.get_instance()
     await db.create_day(
         user_id,
         str(dt.date.today()),
@@ -412,9 +519,13 @@ async def new_day(message: Message):
 
 
 @router.message(Command("set_weight"))
-async def set_weight(message: Message, command: CommandObject):
+async def set_weight(
+    message: Message,
+    command: CommandObject,
+    profile: UserProfile | None
+):
     user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
 
@@ -431,9 +542,13 @@ async def set_weight(message: Message, command: CommandObject):
 
 
 @router.message(Command("progress_graphs"))
-async def send_progress_graphs(message: Message, command: CommandObject):
+async def send_progress_graphs(
+    message: Message,
+    command: CommandObject,
+    profile: UserProfile | None
+):
     user_id = message.from_user.id
-    if not await user_has_profile(user_id):
+    if profile is None:
         await message.reply(PROFILE_NOT_EXISTS_MSG)
         return
 
@@ -446,50 +561,89 @@ async def send_progress_graphs(message: Message, command: CommandObject):
         return
 
     db = await Database.get_instance()
-    rows = await db.get_last_days_stats(user_id, days_num)
-    if not rows:
-        await message.reply(DATA_FOR_GRAPH_NOT_FOUND_MSG)
-        return
-
-    water_data = [
-        {"date": row["date"], "logged_water": row["logged_water"]}
-        for row in rows
-    ]
-    calories_data = [
-        {"date": row["date"], "logged_calories": row["logged_calories"]} for
-        row in rows
+    # Версия меняется при любой записи в daily_stats пользователя,
+    # поэтому закэшированный график с той же версией актуален
+    version = db.get_stats_version(user_id)
+    today = str(dt.date.today())
+    if CHART_MODE == "combined":
+        graph_specs = (COMBINED_PROGRESS_GRAPH,)
+    else:
+        graph_specs = PROGRESS_GRAPHS
+    keys = [
+        (user_id, days_num, metric, today, version)
+        for metric, *_ in graph_specs
     ]
+    graphs = [chart_cache.get(key, None) for key in keys]
+
+    if not all(graphs):
+        if days_num > CHART_MONTHLY_AFTER_DAYS:
+            granularity = "month"
+        elif days_num > CHART_WEEKLY_AFTER_DAYS:
+            granularity = "week"
+        else:
+            granularity = "day"
+        series = await db.get_stats_series(user_id, days_num, granularity)
+        if not series["date"]:
+            await message.reply(DATA_FOR_GRAPH_NOT_FOUND_MSG)
+            return
+
+        # Кэш может вытеснить только часть графиков запроса:
+        # рендерим лишь недостающие
+        missing = [i for i, graph in enumerate(graphs) if not graph]
+        rendered = await asyncio.gather(*(
+            _render_progress_graph(series, graph_specs[i])
+            for i in missing
+        ))
+        for i, graph in zip(missing, rendered):
+            graphs[i] = graph
+
+    extension, mimetype = ChartRenderer.file_format()
+    documents = []
+    for key, graph, (*_, filename) in zip(keys, graphs, graph_specs):
+        # Уже загруженный график отправляем по file_id без повторной загрузки
+        if isinstance(graph, bytes):
+            chart_cache.set(key, graph)
+            documents.append(BufferedInputFile(
+                graph,
+                filename=f"{filename}.{extension}"
+            ))
+        else:
+            documents.append(graph)
+
+    if CHART_MODE == "album" and len(documents) > 1:
+        # Все графики одним запросом sendMediaGroup
+        sent_messages = await message.reply_media_group(media=[
+            InputMediaDocument(media=document)
+            for document in documents
+        ])
+    else:
+        sent_messages = [
+            await message.reply_document(
+                document=document,
+                mimetype=mimetype
+            )
+            for document in documents
+        ]
 
-    water_graph = create_graph(
-        water_data,
-        "logged_water",
-        "Вода (мл)",
-        "Прогресс выпитой воды (за последние 7 дней)"
-    )
-
-    calories_graph = create_graph(
-        calories_data,
-        "logged_calories",
-        "Калории",
-        "Прогресс потребленных калорий (за последние 7 дней)"
-    )
+    for key, sent in zip(keys, sent_messages):
+        if sent.document is not None:
+            chart_cache.set(key, sent.document.file_id)
 
-    water_file = BufferedInputFile(
-        water_graph.read(),
-        filename="water_graph.png"
-    )
-    await message.reply_document(
-        document=water_file,
-        mimetype='image/png'
-    )
 
-    calories_file = BufferedInputFile(
-        calories_graph.read(),
-        filename="calories_graph.png"
-    )
-    await message.reply_document(
-        document=calories_file,
-        mimetype='image/png'
+def _render_progress_graph(series: dict[str, list], spec):
+    metric, ylabel, title, _ = spec
+    if metric == "combined":
+        return ChartRenderer.render_combined_graph(
+            series["date"],
+            series["logged_water"],
+            series["logged_calories"],
+            series["burned_calories"]
+        )
+    return ChartRenderer.render_graph(
+        series["date"],
+        series[metric],
+        ylabel,
+        title
     )
 
 
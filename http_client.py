@@ -0,0 +1,78 @@
+from typing import TYPE_CHECKING
+
+from config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY,
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT,
+    WEATHER_TIMEOUT,
+    NUTRITIONIX_TIMEOUT,
+)
+
+# httpx и googletrans импортируются при первом использовании,
+# чтобы не замедлять запуск бота
+if TYPE_CHECKING:
+    import httpx
+    from googletrans import Translator
+
+
+class HttpClient:
+    _instance: "httpx.AsyncClient | None" = None
+    _translator: "Translator | None" = None
+    _timeouts: dict[str, "httpx.Timeout"] = {}
+
+    @classmethod
+    def get_instance(cls) -> "httpx.AsyncClient":
+        # Клиент живет все время работы бота, чтобы переиспользовать
+        # соединения (keep-alive) вместо нового TCP+TLS на каждый запрос
+        if cls._instance is None or cls._instance.is_closed:
+            import httpx
+
+            cls._instance = httpx.AsyncClient(
+                http2=HTTP2_ENABLED,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(
+                    NUTRITIONIX_TIMEOUT,
+                    connect=HTTP_CONNECT_TIMEOUT
+                ),
+            )
+            cls._timeouts = {
+                "weather": httpx.Timeout(
+                    WEATHER_TIMEOUT,
+                    connect=HTTP_CONNECT_TIMEOUT
+                ),
+                "nutritionix": httpx.Timeout(
+                    NUTRITIONIX_TIMEOUT,
+                    connect=HTTP_CONNECT_TIMEOUT
+                ),
+            }
+        return cls._instance
+
+    @classmethod
+    def timeout(cls, endpoint: str) -> "httpx.Timeout":
+        cls.get_instance()
+        return cls._timeouts[endpoint]
+
+    @classmethod
+    def get_translator(cls) -> "Translator":
+        # Translator держит собственный httpx-клиент, поэтому тоже
+        # создается один раз, а не на каждый перевод
+        if cls._translator is None or cls._translator.client.is_closed:
+            from googletrans import Translator
+
+            cls._translator = Translator(http2=HTTP2_ENABLED)
+        return cls._translator
+
+    @classmethod
+    async def close(cls):
+        if cls._instance is not None:
+            await cls._instance.aclose()
+            cls._instance = None
+        if cls._translator is not None:
+            await cls._translator.client.aclose()
+            cls._translator = None
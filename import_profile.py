@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Модули проекта, время импорта которых выводится всегда
+PROJECT_MODULES = {
+    name.removesuffix(".py")
+    for name in os.listdir(PROJECT_DIR)
+    if name.endswith(".py")
+}
+
+
+def profile_imports(top: int = 25):
+    # Импортирует бота в отдельном процессе с -X importtime и выводит
+    # самые медленные модули и модули проекта
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        capture_output=True,
+        text=True,
+        cwd=PROJECT_DIR
+    )
+    if result.returncode != 0:
+        print(result.stderr, file=sys.stderr)
+        sys.exit(result.returncode)
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((int(cumulative_us), int(self_us), name.strip()))
+
+    total_us = next(
+        cumulative for cumulative, _, name in timings if name == "bot"
+    )
+    print(f"Импорт bot: {total_us / 1000:.1f} мс")
+
+    print(f"\nСамые медленные модули (top {top}, суммарно / собственное):")
+    for cumulative, self_us, name in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative / 1000:10.1f} {self_us / 1000:10.1f}  {name}")
+
+    print("\nМодули проекта:")
+    for cumulative, self_us, name in sorted(timings, reverse=True):
+        if name in PROJECT_MODULES:
+            print(f"{cumulative / 1000:10.1f} {self_us / 1000:10.1f}  {name}")
@@ -0,0 +1,34 @@
+import asyncio
+
+
+class ShardedJob:
+    # Фоновая задача процесса (перевод дня, напоминания): одна задача
+    # asyncio на подкласс, обрабатывает свою долю пользователей
+    enabled = True
+    _task: asyncio.Task | None = None
+    # Доля пользователей процесса: user_id % shards == shard,
+    # общая для всех задач (см. set_shard)
+    shard = 0
+    shards = 1
+
+    @classmethod
+    def start(cls):
+        if cls.enabled and cls._task is None:
+            cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls):
+        if cls._task is not None:
+            cls._task.cancel()
+            await asyncio.gather(cls._task, return_exceptions=True)
+            cls._task = None
+
+    @classmethod
+    async def _run(cls):
+        raise NotImplementedError
+
+
+def set_shard(shard: int, shards: int):
+    # Задается на базовом классе, поэтому действует на все задачи
+    ShardedJob.shard = shard
+    ShardedJob.shards = shards
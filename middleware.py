@@ -1,10 +1,47 @@
+import datetime as dt
+import time
+
 from aiogram import BaseMiddleware
 from aiogram.types import Message
 
 from config import logger
+from database import Database
 
 
 class LoggingMiddleware(BaseMiddleware):
     async def __call__(self, handler, event: Message, data: dict):
         logger.info(f"Получено сообщение: {event.text}")
         return await handler(event, data)
+
+
+class StartupTimingMiddleware(BaseMiddleware):
+    # Один раз пишет в лог время от запуска процесса до первого обновления
+    def __init__(self, started_at: float):
+        self.started_at = started_at
+        self.logged = False
+
+    async def __call__(self, handler, event, data: dict):
+        if not self.logged:
+            self.logged = True
+            logger.info(
+                "Первое обновление получено через "
+                f"{time.monotonic() - self.started_at:.2f} с после запуска"
+            )
+        return await handler(event, data)
+
+
+class UserContextMiddleware(BaseMiddleware):
+    # Загружает профиль и статистику за сегодня одним запросом и передает
+    # их в обработчики команд как profile и daily_stats
+    async def __call__(self, handler, event: Message, data: dict):
+        profile, daily_stats = None, None
+        if event.text and event.text.startswith("/") and event.from_user:
+            db = await Database.get_instance()
+            profile, daily_stats = await db.get_user_context(
+                event.from_user.id,
+                str(dt.date.today())
+            )
+
+        data["profile"] = profile
+        data["daily_stats"] = daily_stats
+        return await handler(event, data)
@@ -0,0 +1,296 @@
+import re
+
+# Локальная таблица калорийности и MET для работы без Nutritionix.
+# Запросы приходят уже переведенными на английский (см. translate_text).
+
+# Продукт: (ккал на 100 г, вес порции/штуки в граммах, {единица: граммы})
+FOODS = {
+    "water": (0, 250, {}),
+    "coffee": (2, 240, {}),
+    "latte": (54, 240, {}),
+    "cappuccino": (46, 180, {}),
+    "americano": (1, 240, {}),
+    "espresso": (9, 30, {}),
+    "tea": (1, 240, {}),
+    "green tea": (1, 240, {}),
+    "black tea": (1, 240, {}),
+    "milk": (60, 250, {}),
+    "kefir": (53, 250, {}),
+    "yogurt": (61, 150, {}),
+    "cottage cheese": (98, 100, {}),
+    "cheese": (402, 30, {"slice": 20}),
+    "sour cream": (198, 30, {}),
+    "butter": (717, 10, {}),
+    "olive oil": (884, 14, {}),
+    "egg": (143, 50, {}),
+    "omelette": (154, 120, {}),
+    "bread": (265, 30, {}),
+    "toast": (313, 30, {}),
+    "white bread": (266, 30, {}),
+    "bun": (280, 60, {}),
+    "porridge": (71, 250, {}),
+    "oatmeal": (71, 250, {}),
+    "buckwheat": (92, 200, {}),
+    "buckwheat porridge": (92, 250, {}),
+    "rice": (130, 200, {}),
+    "pasta": (158, 200, {}),
+    "potato": (77, 150, {}),
+    "mashed potatoes": (88, 200, {}),
+    "soup": (40, 300, {}),
+    "borscht": (49, 300, {}),
+    "salad": (20, 150, {}),
+    "chicken": (239, 150, {}),
+    "chicken breast": (165, 150, {}),
+    "beef": (250, 150, {}),
+    "pork": (242, 150, {}),
+    "turkey": (189, 150, {}),
+    "fish": (206, 150, {}),
+    "salmon": (208, 150, {}),
+    "tuna": (132, 150, {}),
+    "shrimp": (99, 100, {}),
+    "cutlet": (250, 100, {}),
+    "sausage": (301, 50, {}),
+    "dumplings": (275, 200, {}),
+    "pizza": (266, 107, {"slice": 107}),
+    "burger": (295, 200, {}),
+    "shawarma": (220, 300, {}),
+    "apple": (52, 180, {}),
+    "banana": (89, 120, {}),
+    "orange": (47, 130, {}),
+    "tangerine": (53, 75, {}),
+    "pear": (57, 180, {}),
+    "grapes": (69, 150, {}),
+    "strawberries": (32, 150, {}),
+    "tomato": (18, 120, {}),
+    "cucumber": (15, 120, {}),
+    "carrot": (41, 60, {}),
+    "cabbage": (25, 100, {}),
+    "avocado": (160, 150, {}),
+    "nuts": (607, 30, {}),
+    "walnuts": (654, 30, {}),
+    "almonds": (579, 30, {}),
+    "chocolate": (546, 25, {"bar": 100}),
+    "cookies": (488, 15, {}),
+    "cake": (371, 100, {}),
+    "ice cream": (207, 100, {}),
+    "sugar": (387, 5, {}),
+    "honey": (304, 21, {}),
+    "juice": (45, 250, {}),
+    "orange juice": (45, 250, {}),
+    "beer": (43, 500, {}),
+    "wine": (83, 150, {}),
+    "cola": (42, 330, {"can": 330}),
+}
+
+# Единицы веса и объема (объем считается по плотности воды)
+WEIGHT_UNITS = {
+    "g": 1,
+    "gram": 1,
+    "grams": 1,
+    "kg": 1000,
+    "kilogram": 1000,
+    "kilograms": 1000,
+    "ml": 1,
+    "l": 1000,
+    "liter": 1000,
+    "liters": 1000,
+}
+
+# Бытовые меры, если у продукта нет своего веса для них
+SERVING_UNITS = {
+    "cup": 240,
+    "cups": 240,
+    "glass": 250,
+    "glasses": 250,
+    "mug": 300,
+    "tablespoon": 15,
+    "tablespoons": 15,
+    "spoon": 15,
+    "teaspoon": 5,
+    "teaspoons": 5,
+    "slice": 30,
+    "slices": 30,
+    "can": 330,
+    "bar": 100,
+    "plate": None,
+    "serving": None,
+    "servings": None,
+    "piece": None,
+    "pieces": None,
+}
+
+# MET (метаболический эквивалент) видов активности
+METS = {
+    "running": 9.8,
+    "jogging": 7.0,
+    "walking": 3.5,
+    "brisk walking": 4.3,
+    "swimming": 6.0,
+    "cycling": 7.5,
+    "stationary bike": 6.8,
+    "yoga": 2.5,
+    "pilates": 3.0,
+    "dancing": 5.0,
+    "tennis": 7.3,
+    "soccer": 7.0,
+    "basketball": 6.5,
+    "volleyball": 4.0,
+    "boxing": 7.8,
+    "rowing": 7.0,
+    "skiing": 7.0,
+    "ice skating": 7.0,
+    "jump rope": 11.0,
+    "jumping rope": 11.0,
+    "stretching": 2.3,
+    "weight lifting": 5.0,
+    "gym workout": 5.0,
+    "aerobics": 6.8,
+    "crossfit": 8.0,
+    "hiking": 6.0,
+}
+
+DURATION_UNITS = {
+    "min": 1,
+    "mins": 1,
+    "minute": 1,
+    "minutes": 1,
+    "h": 60,
+    "hour": 60,
+    "hours": 60,
+}
+
+MATCH_THRESHOLD = 0.45
+
+_NUMBER_RE = re.compile(r"^\d+(?:[.,]\d+)?$")
+_SKIP_WORDS = {"a", "an", "of", "and", "with"}
+
+
+def _trigrams(text: str) -> set[str]:
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _build_index(names) -> dict[str, list[str]]:
+    # Триграмма -> названия, в которых она встречается; строится один раз
+    # при импорте, поиск перебирает только названия с общими триграммами
+    index: dict[str, list[str]] = {}
+    for name in names:
+        for trigram in _trigrams(name):
+            index.setdefault(trigram, []).append(name)
+    return index
+
+
+_FOOD_INDEX = _build_index(FOODS)
+_FOOD_TRIGRAMS = {name: _trigrams(name) for name in FOODS}
+_MET_INDEX = _build_index(METS)
+_MET_TRIGRAMS = {name: _trigrams(name) for name in METS}
+
+
+def fuzzy_match(
+    name: str,
+    index: dict[str, list[str]],
+    name_trigrams: dict[str, set[str]]
+) -> str | None:
+    if name in name_trigrams:
+        return name
+
+    trigrams = _trigrams(name)
+    shared: dict[str, int] = {}
+    for trigram in trigrams:
+        for candidate in index.get(trigram, ()):
+            shared[candidate] = shared.get(candidate, 0) + 1
+
+    best, best_score = None, MATCH_THRESHOLD
+    for candidate, count in shared.items():
+        # Коэффициент Дайса по множествам триграмм
+        score = 2 * count / (len(trigrams) + len(name_trigrams[candidate]))
+        if score > best_score:
+            best, best_score = candidate, score
+    return best
+
+
+def _split_query(query: str, units) -> tuple[float | None, str | None, str]:
+    # "2 cups latte", "latte 1 cup", "chocolate 100 grams" ->
+    # (количество, единица, название)
+    amount, unit, words = None, None, []
+    for word in query.casefold().split():
+        if _NUMBER_RE.match(word):
+            amount = float(word.replace(",", "."))
+        elif word in units and unit is None:
+            unit = word
+        elif word not in _SKIP_WORDS:
+            words.append(word)
+    return amount, unit, " ".join(words)
+
+
+def find_food(query: str) -> dict | None:
+    amount, unit, name = _split_query(
+        query,
+        WEIGHT_UNITS.keys() | SERVING_UNITS.keys()
+    )
+    food_name = fuzzy_match(name, _FOOD_INDEX, _FOOD_TRIGRAMS)
+    if food_name is None:
+        return None
+
+    kcal_per_100g, serving_grams, food_units = FOODS[food_name]
+    if unit in WEIGHT_UNITS:
+        grams = (amount or 1) * WEIGHT_UNITS[unit]
+    else:
+        singular = unit.removesuffix("s") if unit else None
+        unit_grams = (
+            food_units.get(unit)
+            or food_units.get(singular)
+            or SERVING_UNITS.get(unit)
+        )
+        grams = (amount or 1) * (unit_grams or serving_grams)
+
+    # Поля как в ответе Nutritionix, которые использует бот
+    return {
+        "food_name": food_name,
+        "serving_weight_grams": round(grams, 1),
+        "nf_calories": round(kcal_per_100g * grams / 100, 1),
+    }
+
+
+def _resting_kcal_per_day(
+    sex: str | None,
+    weight_kg: float,
+    height_cm: float,
+    age: int
+) -> float:
+    # Харрис-Бенедикт; без пола - среднее мужской и женской формул
+    male = 66.47 + 13.75 * weight_kg + 5.003 * height_cm - 6.755 * age
+    female = 655.1 + 9.563 * weight_kg + 1.85 * height_cm - 4.676 * age
+    if sex in ("male", "Мужчина"):
+        return male
+    if sex in ("female", "Женщина"):
+        return female
+    return (male + female) / 2
+
+
+def find_exercise(
+    query: str,
+    weight_kg: float,
+    height_cm: float,
+    age: int,
+    sex: str | None = None
+) -> dict | None:
+    amount, unit, name = _split_query(query, DURATION_UNITS)
+    exercise_name = fuzzy_match(name, _MET_INDEX, _MET_TRIGRAMS)
+    if exercise_name is None or not amount:
+        return None
+
+    minutes = amount * DURATION_UNITS.get(unit, 1)
+    # MET рассчитан на стандартный расход 3.5 мл O2/кг/мин; поправка
+    # на собственный расход покоя по весу, росту, возрасту и полу
+    # (1 л O2 ~ 5 ккал)
+    resting = _resting_kcal_per_day(sex, weight_kg, height_cm, age)
+    resting_ml_kg_min = resting / 5 / 1440 * 1000 / weight_kg
+    met = METS[exercise_name] * 3.5 / resting_ml_kg_min
+
+    return {
+        "name": exercise_name,
+        "duration_min": minutes,
+        "met": round(met, 2),
+        "nf_calories": round(met * weight_kg * minutes / 60, 1),
+    }
@@ -0,0 +1,36 @@
+import argparse
+import json
+
+import httpx
+
+from config import WEBHOOK_PATH, WEBHOOK_PORT, WEBHOOK_SECRET
+
+
+def main():
+    # Отправляет сохраненные обновления (по одному JSON на строку)
+    # на локальный вебхук, как это делает Telegram
+    parser = argparse.ArgumentParser(
+        description="Отправка сохраненных обновлений на вебхук"
+    )
+    parser.add_argument("updates", help="файл с обновлениями (JSON Lines)")
+    parser.add_argument(
+        "--url",
+        default=f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    )
+    args = parser.parse_args()
+
+    headers = {}
+    if WEBHOOK_SECRET:
+        headers["X-Telegram-Bot-Api-Secret-Token"] = WEBHOOK_SECRET
+
+    with httpx.Client(headers=headers) as client, open(args.updates) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            update = json.loads(line)
+            response = client.post(args.url, json=update)
+            print(update.get("update_id"), response.status_code)
+
+
+if __name__ == "__main__":
+    main()
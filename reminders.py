@@ -0,0 +1,180 @@
+import asyncio
+import datetime as dt
+import heapq
+import time
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError
+
+from config import (
+    REMINDERS_ENABLED,
+    REMINDER_INTERVAL_MIN,
+    REMINDER_START_HOUR,
+    REMINDER_END_HOUR,
+    REMINDER_BATCH_SIZE,
+    logger
+)
+from database import Database
+from jobs import ShardedJob
+from send_queue import bulk_sends
+
+REMINDER_INTERVAL = REMINDER_INTERVAL_MIN * 60
+
+
+def format_reminder(logged_water: int, water_goal: int) -> str:
+    return (
+        f"Не забывайте пить воду: выпито {round(logged_water)} из "
+        f"{water_goal} мл, осталось {round(water_goal - logged_water)} мл. "
+        "Отметить воду: /log_water <мл>"
+    )
+
+
+def _hour_ts(date: dt.date, hour: int) -> float:
+    return dt.datetime.combine(date, dt.time()).timestamp() + hour * 3600
+
+
+class Reminders(ShardedJob):
+    # Один таймер на процесс: куча (время, user_id) вместо задачи на
+    # каждого пользователя, память - одна запись кучи на напоминание
+    enabled = REMINDERS_ENABLED
+    _bot: Bot | None = None
+    _heap: list[tuple[float, int]] = []
+    # Пользователи, уже запланированные на текущий день
+    _scheduled: set[int] = set()
+    _date: dt.date | None = None
+    sent = 0
+
+    @classmethod
+    def start(cls, bot: Bot):
+        cls._bot = bot
+        super().start()
+
+    @classmethod
+    async def stop(cls):
+        await super().stop()
+        cls._heap = []
+        cls._scheduled = set()
+        cls._date = None
+
+    @classmethod
+    async def _run(cls):
+        next_scan = 0.0
+        while True:
+            today = dt.date.today()
+            now = time.time()
+            start = _hour_ts(today, REMINDER_START_HOUR)
+            end = _hour_ts(today, REMINDER_END_HOUR)
+            if cls._date != today:
+                cls._heap = []
+                cls._scheduled = set()
+                cls._date = today
+                next_scan = 0.0
+            if now < start:
+                await asyncio.sleep(start - now)
+                continue
+            if now >= end:
+                tomorrow = today + dt.timedelta(days=1)
+                await asyncio.sleep(
+                    _hour_ts(tomorrow, REMINDER_START_HOUR) - now
+                )
+                continue
+
+            try:
+                # Новые отстающие (начали день, отменили запись) находятся
+                # повторным проходом по индексу раз в интервал
+                if now >= next_scan:
+                    next_scan = now + REMINDER_INTERVAL
+                    await cls._schedule_behind(today, now)
+
+                batch = []
+                while (
+                    cls._heap
+                    and cls._heap[0][0] <= now
+                    and len(batch) < REMINDER_BATCH_SIZE
+                ):
+                    batch.append(heapq.heappop(cls._heap)[1])
+                if batch:
+                    await cls._remind(today, batch, now, end)
+                    continue
+            except Exception:
+                logger.exception("Не удалось отправить напоминания")
+
+            wake = min(next_scan, end)
+            if cls._heap:
+                wake = min(wake, cls._heap[0][0])
+            await asyncio.sleep(max(wake - time.time(), 0))
+
+    @classmethod
+    async def _schedule_behind(cls, date: dt.date, now: float):
+        db = await Database.get_instance()
+        after_user_id = 0
+        while True:
+            user_ids = await db.get_water_behind_page(
+                str(date),
+                after_user_id,
+                REMINDER_BATCH_SIZE,
+                cls.shard,
+                cls.shards
+            )
+            for user_id in user_ids:
+                if user_id in cls._scheduled:
+                    continue
+                cls._scheduled.add(user_id)
+                # Первое напоминание - в случайный момент интервала, чтобы
+                # не отправлять всем пользователям одновременно
+                heapq.heappush(
+                    cls._heap,
+                    (now + user_id % REMINDER_INTERVAL, user_id)
+                )
+            if len(user_ids) < REMINDER_BATCH_SIZE:
+                return
+            after_user_id = user_ids[-1]
+
+    @classmethod
+    async def _remind(
+        cls,
+        date: dt.date,
+        user_ids: list[int],
+        now: float,
+        end: float
+    ):
+        # Перед отправкой пачка перепроверяется одним запросом: кто
+        # выпил норму, выпадает из расписания до следующего прохода
+        db = await Database.get_instance()
+        try:
+            behind = await db.get_water_behind(str(date), user_ids)
+        except Exception:
+            # Пачка уже снята с кучи: без этого ее пользователи остались
+            # бы в _scheduled и не получили напоминаний до конца дня
+            cls._scheduled.difference_update(user_ids)
+            raise
+        for user_id in user_ids:
+            if user_id not in behind:
+                cls._scheduled.discard(user_id)
+
+        with bulk_sends():
+            results = await asyncio.gather(
+                *(
+                    cls._bot.send_message(
+                        user_id,
+                        format_reminder(*behind[user_id])
+                    )
+                    for user_id in behind
+                ),
+                return_exceptions=True
+            )
+
+        for user_id, result in zip(behind, results):
+            if isinstance(result, TelegramForbiddenError):
+                # Бот заблокирован: остается в _scheduled без записи в
+                # куче, чтобы не напоминать до конца дня
+                continue
+            if isinstance(result, Exception):
+                logger.warning(
+                    f"Не удалось отправить напоминание {user_id}: {result}"
+                )
+            else:
+                cls.sent += 1
+            due = now + REMINDER_INTERVAL
+            if due < end:
+                heapq.heappush(cls._heap, (due, user_id))
@@ -0,0 +1,85 @@
+import asyncio
+import datetime as dt
+
+from config import (
+    ROLLOVER_ENABLED,
+    ROLLOVER_ACTIVE_DAYS,
+    ROLLOVER_WEATHER_CONCURRENCY,
+    logger
+)
+from database import Database
+from jobs import ShardedJob
+from utils import get_current_temperature, calculate_day_goals
+
+
+async def roll_over(date: dt.date, shard: int = 0, shards: int = 1) -> int:
+    # Создает дни всем недавно активным пользователям (своей доли при
+    # нескольких процессах): одна погода на город и одна транзакция
+    db = await Database.get_instance()
+    profiles = await db.get_users_without_day(
+        str(date),
+        str(date - dt.timedelta(days=ROLLOVER_ACTIVE_DAYS)),
+        shard,
+        shards
+    )
+    if not profiles:
+        return 0
+
+    semaphore = asyncio.Semaphore(ROLLOVER_WEATHER_CONCURRENCY)
+
+    async def city_temperature(city: str):
+        async with semaphore:
+            try:
+                return await get_current_temperature(city)
+            except Exception:
+                logger.exception(f"Не удалось получить погоду: {city}")
+                return None
+
+    cities = list({profile.city for profile in profiles})
+    temperatures = dict(zip(
+        cities,
+        await asyncio.gather(*map(city_temperature, cities))
+    ))
+
+    rows = []
+    for profile in profiles:
+        temperature = temperatures[profile.city]
+        # Без погоды день создаст сам пользователь через /new_day
+        if temperature is None:
+            continue
+        water_goal, calories_goal = calculate_day_goals(profile, temperature)
+        rows.append((
+            profile.user_id,
+            str(date),
+            temperature,
+            water_goal,
+            calories_goal
+        ))
+
+    await db.create_days(rows)
+    logger.info(
+        f"Новый день {date}: создано {len(rows)} из {len(profiles)}, "
+        f"городов: {len(cities)}"
+    )
+    return len(rows)
+
+
+class Rollover(ShardedJob):
+    enabled = ROLLOVER_ENABLED
+
+    @classmethod
+    async def _run(cls):
+        # Сразу после запуска догоняем пропущенную полночь, затем
+        # ждем следующую полночь по локальному времени сервера
+        while True:
+            try:
+                await roll_over(dt.date.today(), cls.shard, cls.shards)
+            except Exception:
+                logger.exception("Не удалось начать новый день")
+
+            now = dt.datetime.now()
+            midnight = dt.datetime.combine(
+                now.date() + dt.timedelta(days=1),
+                dt.time()
+            )
+            await asyncio.sleep((midnight - now).total_seconds())
@@ -0,0 +1,217 @@
+import asyncio
+import contextlib
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import (
+    BaseRequestMiddleware,
+    NextRequestMiddlewareType
+)
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMediaGroup, TelegramMethod
+
+from cache import TTLCache, MISSING
+from config import (
+    BOT_MODE,
+    SHARD_WORKERS,
+    WEBHOOK_WORKERS,
+    SEND_RATE_LIMIT,
+    SEND_CHAT_RATE_LIMIT,
+    SEND_CHAT_BURST,
+    SEND_MAX_RETRIES,
+    logger
+)
+
+INTERACTIVE = 0
+BULK = 1
+
+# Приоритет исходящих запросов текущей задачи: ответы на команды -
+# INTERACTIVE, рассылки (напоминания и т.п.) оборачиваются в bulk_sends()
+send_priority: ContextVar[int] = ContextVar(
+    "send_priority",
+    default=INTERACTIVE
+)
+
+
+@contextlib.contextmanager
+def bulk_sends():
+    token = send_priority.set(BULK)
+    try:
+        yield
+    finally:
+        send_priority.reset(token)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait_time(self, now: float, cost: float) -> float:
+        # Через сколько секунд будет доступно cost токенов
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        cost = min(cost, self.capacity)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def consume(self, cost: float):
+        self.tokens -= min(cost, self.capacity)
+
+    def block(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+
+
+def _processes() -> int:
+    # Лимит Telegram общий на бота, поэтому делится между процессами
+    if BOT_MODE == "sharded":
+        return SHARD_WORKERS
+    if BOT_MODE == "webhook":
+        return max(WEBHOOK_WORKERS, 1)
+    return 1
+
+
+class SendQueue(BaseRequestMiddleware):
+    # Очередь исходящих запросов в чаты: общий и по-чатовый token bucket,
+    # полоса INTERACTIVE обслуживается раньше BULK. Запросы без chat_id
+    # (getUpdates, answerCallbackQuery и т.п.) идут без очереди
+    def __init__(self):
+        self._global = TokenBucket(
+            SEND_RATE_LIMIT / _processes(),
+            max(SEND_RATE_LIMIT / _processes(), 1)
+        )
+        self._chats = TTLCache(100000, ttl=60)
+        self._lanes = (deque(), deque())
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        self.sent = [0, 0]
+        self.max_depth = [0, 0]
+        self.wait_seconds = [0.0, 0.0]
+        self.retry_after = 0
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ):
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await make_request(bot, method)
+
+        cost = len(method.media) if isinstance(method, SendMediaGroup) else 1
+        retries = 0
+        while True:
+            await self._acquire(chat_id, cost)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as error:
+                # Чат ждет retry_after, остальные чаты продолжают отправку
+                self.retry_after += 1
+                self._chat_bucket(chat_id).block(
+                    time.monotonic() + error.retry_after
+                )
+                retries += 1
+                if retries > SEND_MAX_RETRIES:
+                    raise
+                logger.warning(
+                    f"Flood control в чате {chat_id}: "
+                    f"повтор через {error.retry_after} с"
+                )
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is MISSING:
+            bucket = TokenBucket(SEND_CHAT_RATE_LIMIT, SEND_CHAT_BURST)
+        # Запись продлевает TTL: бакет активного чата не вытесняется
+        self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def _acquire(self, chat_id, cost: int):
+        lane = send_priority.get()
+        future = asyncio.get_running_loop().create_future()
+        self._lanes[lane].append((chat_id, cost, future, time.monotonic()))
+        self.max_depth[lane] = max(
+            self.max_depth[lane],
+            len(self._lanes[lane])
+        )
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        self._wakeup.set()
+        await future
+
+    def _grant(self) -> float | None:
+        # Выдает разрешения всем запросам, для которых есть токены;
+        # возвращает время до следующей попытки или None, если очередь пуста
+        now = time.monotonic()
+        next_wait = None
+        for lane, queue in enumerate(self._lanes):
+            for item in list(queue):
+                chat_id, cost, future, queued_at = item
+                if future.done():
+                    queue.remove(item)
+                    continue
+
+                global_wait = self._global.wait_time(now, cost)
+                if global_wait > 0:
+                    # Общий лимит исчерпан: ждать нужно всем полосам
+                    return global_wait
+                bucket = self._chat_bucket(chat_id)
+                chat_wait = bucket.wait_time(now, cost)
+                if chat_wait > 0:
+                    if next_wait is None or chat_wait < next_wait:
+                        next_wait = chat_wait
+                    continue
+
+                self._global.consume(cost)
+                bucket.consume(cost)
+                queue.remove(item)
+                self.sent[lane] += 1
+                self.wait_seconds[lane] += now - queued_at
+                future.set_result(None)
+        return next_wait
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            wait = self._grant()
+            if wait is None:
+                await self._wakeup.wait()
+                continue
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    def metrics(self) -> dict:
+        return {
+            lane_name: {
+                "queued": len(self._lanes[lane]),
+                "max_depth": self.max_depth[lane],
+                "sent": self.sent[lane],
+                "avg_wait_ms": round(
+                    self.wait_seconds[lane] / self.sent[lane] * 1000, 1
+                ) if self.sent[lane] else 0.0,
+            }
+            for lane, lane_name in (
+                (INTERACTIVE, "interactive"),
+                (BULK, "bulk"),
+            )
+        } | {"retry_after": self.retry_after}
@@ -0,0 +1,158 @@
+import asyncio
+import multiprocessing as mp
+import signal
+from typing import Callable
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from config import SHARD_WORKERS, SHARD_QUEUE_SIZE, logger
+
+POLLING_TIMEOUT = 30
+
+
+def update_user_id(update: Update) -> int:
+    # Обновления одного пользователя всегда попадают в один процесс,
+    # поэтому кэши и отложенные записи в памяти процесса остаются верными
+    try:
+        event = update.event
+    except Exception:
+        return update.update_id
+
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id
+    return update.update_id
+
+
+def shard_for(user_id: int, shards: int = SHARD_WORKERS) -> int:
+    return user_id % shards
+
+
+async def consume_updates(dp: Dispatcher, bot: Bot, queue: mp.Queue):
+    # Цикл процесса-воркера: обновления приходят от фронтового процесса
+    # в виде JSON и обрабатываются тем же Dispatcher, что и при polling
+    await dp.emit_startup(bot=bot)
+    loop = asyncio.get_running_loop()
+    # Последняя задача каждого пользователя: обновления разных
+    # пользователей обрабатываются параллельно, одного - по порядку
+    # (иначе ответ на вопрос анкеты может обогнать саму команду)
+    last_tasks: dict[int, asyncio.Task] = {}
+
+    async def handle(update: Update, previous: asyncio.Task | None):
+        if previous is not None:
+            await asyncio.wait((previous,))
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            logger.exception(
+                f"Ошибка обработки обновления {update.update_id}"
+            )
+
+    def forget(user_id: int, task: asyncio.Task):
+        if last_tasks.get(user_id) is task:
+            del last_tasks[user_id]
+
+    try:
+        while True:
+            raw_update = await loop.run_in_executor(None, queue.get)
+            if raw_update is None:
+                break
+
+            update = Update.model_validate_json(
+                raw_update,
+                context={"bot": bot}
+            )
+            user_id = update_user_id(update)
+            task = asyncio.create_task(
+                handle(update, last_tasks.get(user_id))
+            )
+            last_tasks[user_id] = task
+            task.add_done_callback(lambda t, u=user_id: forget(u, t))
+    finally:
+        if last_tasks:
+            await asyncio.gather(
+                *last_tasks.values(),
+                return_exceptions=True
+            )
+        await dp.emit_shutdown(bot=bot)
+        await bot.session.close()
+
+
+async def route_updates(
+    bot: Bot,
+    queues: list[mp.Queue],
+    allowed_updates: list[str]
+):
+    # Фронтовой процесс только получает обновления и раскладывает их
+    # по очередям воркеров по user_id
+    loop = asyncio.get_running_loop()
+    offset = None
+    try:
+        while True:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=POLLING_TIMEOUT,
+                allowed_updates=allowed_updates
+            )
+            for update in updates:
+                queue = queues[shard_for(update_user_id(update), len(queues))]
+                # put блокируется, если очередь воркера заполнена
+                await loop.run_in_executor(
+                    None,
+                    queue.put,
+                    update.model_dump_json(exclude_unset=True)
+                )
+                offset = update.update_id + 1
+    finally:
+        await bot.session.close()
+
+
+def run_sharded(
+    bot: Bot,
+    dp: Dispatcher,
+    run_worker: Callable[[int, mp.Queue], None]
+):
+    # run_worker запускает цикл воркера с Dispatcher и Bot модуля bot.py
+    context = mp.get_context("spawn")
+    queues = [context.Queue(SHARD_QUEUE_SIZE) for _ in range(SHARD_WORKERS)]
+    workers = [
+        context.Process(
+            target=run_worker,
+            args=(index, queue),
+            name=f"shard-{index}"
+        )
+        for index, queue in enumerate(queues)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Запущено процессов-воркеров: {len(workers)}")
+
+    def stop(*_):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        asyncio.run(route_updates(
+            bot,
+            queues,
+            dp.resolve_used_update_types()
+        ))
+    except KeyboardInterrupt:
+        logger.info("Остановка: ожидание воркеров.")
+    finally:
+        # Воркеры дорабатывают уже полученные обновления и выполняют
+        # shutdown (в том числе запись отложенных изменений в базу)
+        for queue in queues:
+            queue.put(None)
+        for worker in workers:
+            worker.join()
+
+
+def ignore_interrupts():
+    # Ctrl+C в терминале получает вся группа процессов; воркеры
+    # останавливает фронтовой процесс, отправляя им None в очередь
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
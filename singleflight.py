@@ -0,0 +1,39 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight: dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable]):
+        # Одинаковые одновременные запросы ждут один и тот же вызов
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.calls += 1
+        task = asyncio.ensure_future(func())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda t: self._forget(key, t))
+        # shield, чтобы отмена одного из ожидающих не отменяла запрос
+        # для остальных
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        self._in_flight.pop(key, None)
+        # Помечаем исключение как полученное, даже если все ожидающие
+        # были отменены
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
@@ -6,7 +6,8 @@ HELP_MSG = (
     "/start - Начало работы\n"
     "/set_profile - Заполнение профиля\n"
     "/log_water - Логирование воды в миллилитрах (/log_water 100)\n"
-    "/log_food - Логирование еды (/log_food латте 1 чашка)\n"
+    "/log_food - Логирование еды (/log_food латте 1 чашка), "
+    "можно несколько продуктов через запятую (/log_food 2 яйца, тост)\n"
     "/log_workout - Логирование тренировки с длительностью в минутах "
     "(/log_workout бег 60)\n"
     "/check_progress - Проверка прогресса\n"
@@ -15,7 +16,9 @@ HELP_MSG = (
     "/set_weight - Обновление данных о весе (/set_weight 70)"
     "(вступает в силу после выполнения /new_day)\n"
     "/progress_graphs - Графики прогресса за последние N дней "
-    "(/progress_graphs 10 (по умолчанию 7))"
+    "(/progress_graphs 10 (по умолчанию 7))\n"
+    "/history - Записи за сегодня\n"
+    "/undo - Отмена последней записи за сегодня"
 )
 
 ENTER_SEX_MSG = "Укажите ваш пол"
@@ -62,6 +65,8 @@ ENTER_KG_ERROR_MSG = (
 NEW_DAY_ALREADY_BEGUN = "День уже начат"
 DATA_FOR_GRAPH_NOT_FOUND_MSG = "Данные для графика не найдены"
 ENTER_INT_DAYS_ERROR_MSG = "Неверный формат: значение должно быть целым числом"
+HISTORY_EMPTY_MSG = "За сегодня еще нет записей"
+UNDO_EMPTY_MSG = "Нет записей за сегодня для отмены"
 
 PROFILE_NOT_EXISTS_MSG = (
     "Вы не настроили профиль. "
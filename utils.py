@@ -1,135 +1,310 @@
-import datetime as dt
-import io
-
-import httpx
-from googletrans import Translator
-import matplotlib.pyplot as plt
-from matplotlib import dates as mdates
+import re
 
+from cache import TTLCache, MISSING, normalize_key
 from config import (
     OPEN_WEATHER_API_KEY,
     NUTRITIONIX_API_APP_ID,
-    NUTRITIONIX_API_APP_KEY
+    NUTRITIONIX_API_APP_KEY,
+    WEATHER_CACHE_TTL,
+    WEATHER_CACHE_NEGATIVE_TTL,
+    WEATHER_CACHE_SIZE,
+    FOOD_CACHE_SIZE,
+    TRANSLATION_CACHE_SIZE,
+    TRANSLATION_CACHE_PERSIST,
+    NUTRITION_LOCAL,
+    logger
 )
 from database import Database
+from dictionary import translate_with_dictionary
+from singleflight import SingleFlight
+from http_client import HttpClient
+from nutrition import find_food, find_exercise
+
+temperature_cache = TTLCache(WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL)
+food_cache = TTLCache(FOOD_CACHE_SIZE)
+translation_cache = TTLCache(TRANSLATION_CACHE_SIZE)
+translation_stats = {
+    "dictionary_hits": 0,
+    "memory_hits": 0,
+    "db_hits": 0,
+    "misses": 0,
+}
+
+# Запятая между цифрами - десятичная ("молоко 0,5 л"), не разделитель
+FOOD_ITEM_SEPARATORS = re.compile(
+    r"(?<!\d),|,(?!\d)|[;+\n]|\s(?:и|and)\s",
+    re.IGNORECASE
+)
 
+temperature_flight = SingleFlight("temperature")
+food_flight = SingleFlight("food")
+exercise_flight = SingleFlight("exercise")
+translation_flight = SingleFlight("translation")
 
-def create_graph(data: list[dict], key: str, ylabel: str, title: str):
-    dates = [
-        dt.datetime.strptime(entry["date"], "%Y-%m-%d")
-        for entry in data
-    ]
-    values = [entry[key] for entry in data]
-
-    fig, ax = plt.subplots()
-    ax.plot(dates, values, marker="o")
-
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m-%d"))
-    ax.xaxis.set_major_locator(mdates.DayLocator())
 
-    plt.xlabel("Дата")
-    plt.ylabel(ylabel)
-    plt.title(title)
-    plt.xticks(rotation=45)
-    plt.tight_layout()
+def get_upstream_metrics() -> dict:
+    return {
+        flight.name: flight.stats()
+        for flight in (
+            temperature_flight,
+            food_flight,
+            exercise_flight,
+            translation_flight,
+        )
+    } | {"translation_cache": get_translation_metrics()}
 
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format="png")
-    plt.close(fig)
-    buffer.seek(0)
-    return buffer
 
+def get_translation_metrics() -> dict:
+    total = sum(translation_stats.values())
+    hits = total - translation_stats["misses"]
+    return translation_stats | {
+        "hit_rate": round(hits / total, 3) if total else 0.0
+    }
 
-async def user_has_profile(user_id: int):
-    db = await Database.get_instance()
-    return await db.get_user(user_id) is not None
 
+async def translate_text(query: str):
+    key = normalize_key(query)
+    translation = translate_with_dictionary(key)
+    if translation is not None:
+        translation_stats["dictionary_hits"] += 1
+        return translation
+
+    translation = translation_cache.get(key)
+    if translation is not MISSING:
+        translation_stats["memory_hits"] += 1
+        return translation
+
+    return await translation_flight.do(
+        key,
+        lambda: _load_translation(key, query)
+    )
+
+
+async def _load_translation(key: str, query: str):
+    db = await Database.get_instance() if TRANSLATION_CACHE_PERSIST else None
+    translation = await db.get_translation(key) if db else None
+    if translation is not None:
+        translation_stats["db_hits"] += 1
+    else:
+        translation_stats["misses"] += 1
+        translation = await _translate_text(query)
+        if db:
+            await db.save_translation(key, translation)
 
-async def new_day_was_begun(user_id: int):
-    db = await Database.get_instance()
-    return await db.get_daily_stats(user_id, str(dt.date.today())) is not None
+    translation_cache.set(key, translation)
+    return translation
 
 
-async def translate_text(query: str):
-    async with Translator() as translator:
-        result = await translator.translate(query)
-        return result.text
+async def _translate_text(query: str):
+    result = await HttpClient.get_translator().translate(query)
+    return result.text
 
 
 async def get_current_temperature(city: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.openweathermap.org/data/2.5/weather",
-            params={
-                "q": city,
-                "appid": OPEN_WEATHER_API_KEY,
-                "units": "metric"
-            }
-        )
+    key = normalize_key(city)
+    temperature = temperature_cache.get(key)
+    if temperature is not MISSING:
+        return temperature
+
+    return await temperature_flight.do(
+        key,
+        lambda: _load_current_temperature(key, city)
+    )
+
+
+async def _load_current_temperature(key: str, city: str):
+    temperature = await _fetch_current_temperature(city)
+    # Ответ "город не найден" тоже кэшируем, но на меньший срок
+    temperature_cache.set(
+        key,
+        temperature,
+        ttl=WEATHER_CACHE_NEGATIVE_TTL if temperature is None else None
+    )
+    return temperature
+
+
+async def _fetch_current_temperature(city: str):
+    client = HttpClient.get_instance()
+    response = await client.get(
+        "https://api.openweathermap.org/data/2.5/weather",
+        params={
+            "q": city,
+            "appid": OPEN_WEATHER_API_KEY,
+            "units": "metric"
+        },
+        timeout=HttpClient.timeout("weather")
+    )
+
+    if response.status_code == 404:
+        return None
+
+    return response.json()["main"]["temp"]
+
+
+def split_food_items(text: str) -> list[str]:
+    # "2 яйца, тост и кофе" -> ["2 яйца", "тост", "кофе"]
+    return [
+        item.strip()
+        for item in FOOD_ITEM_SEPARATORS.split(text)
+        if item.strip()
+    ]
 
-        try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError:
-            if response.status_code == 404:
-                return None
-
-        return response.json()["main"]["temp"]
-
-
-async def get_food_info(query: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://trackapi.nutritionix.com/v2/natural/nutrients",
-            headers={
-                "x-app-id": NUTRITIONIX_API_APP_ID,
-                "x-app-key": NUTRITIONIX_API_APP_KEY
-            },
-            json={"query": query},
-        )
 
+async def get_foods_info(queries: list[str]) -> list[dict]:
+    # queries уже переведены, ключи - нормализованные английские запросы.
+    # Каждый продукт ищется в кэше в памяти и в базе, а все
+    # ненайденные запрашиваются у Nutritionix одним запросом
+    keys = [normalize_key(query) for query in queries]
+    foods: dict[str, dict] = {}
+    for key in keys:
+        food_info = food_cache.get(key)
+        if food_info is MISSING and NUTRITION_LOCAL == "first":
+            food_info = find_food(key) or MISSING
+        if food_info is not MISSING:
+            foods[key] = food_info
+
+    missing = {
+        key: query
+        for key, query in zip(keys, queries)
+        if key not in foods
+    }
+    if not missing:
+        return [foods[key] for key in keys]
+
+    missing_keys = tuple(missing)
+    loaded = await food_flight.do(
+        missing_keys,
+        lambda: _load_foods_info(missing_keys, list(missing.values()))
+    )
+    if isinstance(loaded, list):
+        # Ответ не удалось сопоставить с продуктами запроса:
+        # учитываем все найденное, но по продуктам не кэшируем
+        return [foods[key] for key in keys if key in foods] + loaded
+
+    foods |= loaded
+    return [foods[key] for key in keys if key in foods]
+
+
+async def _load_foods_info(
+    keys: tuple[str, ...],
+    queries: list[str]
+) -> dict[str, dict] | list[dict]:
+    db = await Database.get_instance()
+    foods = await db.get_foods_info(keys)
+    missing = [
+        (key, query)
+        for key, query in zip(keys, queries)
+        if key not in foods
+    ]
+    if missing:
         try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError:
-            if response.status_code == 404:
-                return None
-
-        data = response.json()
-        if not data.get("foods", []):
-            return None
-        return data["foods"][0]
+            fetched = await _fetch_foods_info(
+                ", ".join(query for _, query in missing)
+            )
+        except Exception:
+            if NUTRITION_LOCAL != "fallback":
+                raise
+            logger.exception("Nutritionix недоступен")
+            fetched = []
+
+        if not fetched and NUTRITION_LOCAL == "fallback":
+            # Результаты локальной таблицы не кэшируются как ответы API
+            local = [find_food(query) for _, query in missing]
+            return list(foods.values()) + [info for info in local if info]
+        if len(missing) != 1 or len(fetched) != 1:
+            # В ответе нет исходных запросов, поэтому продукты нельзя
+            # надежно сопоставить с ними: учитываем все найденное, но
+            # кэшируем только ответ из одного продукта на один запрос
+            for key, food_info in foods.items():
+                food_cache.set(key, food_info)
+            return list(foods.values()) + fetched
+
+        new_foods = {missing[0][0]: fetched[0]}
+        await db.save_foods_info(new_foods)
+        foods |= new_foods
+
+    for key, food_info in foods.items():
+        food_cache.set(key, food_info)
+    return foods
+
+
+async def _fetch_foods_info(query: str) -> list[dict]:
+    # Natural-эндпоинт разбирает фразу из нескольких продуктов
+    # и возвращает по элементу foods на каждый
+    client = HttpClient.get_instance()
+    response = await client.post(
+        "https://trackapi.nutritionix.com/v2/natural/nutrients",
+        headers={
+            "x-app-id": NUTRITIONIX_API_APP_ID,
+            "x-app-key": NUTRITIONIX_API_APP_KEY
+        },
+        json={"query": query},
+        timeout=HttpClient.timeout("nutritionix")
+    )
+
+    if response.status_code == 404:
+        return []
+
+    return response.json().get("foods", [])
 
 
 async def get_exercise_info(
     query: str,
     weight_kg: float,
     height_cm: float,
-    age: int
+    age: int,
+    sex: str | None = None
 ):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://trackapi.nutritionix.com/v2/natural/exercise",
-            headers={
-                "x-app-id": NUTRITIONIX_API_APP_ID,
-                "x-app-key": NUTRITIONIX_API_APP_KEY
-            },
-            json={
-                "query": query,
-                "weight_kg": weight_kg,
-                "height_cm": height_cm,
-                "age": age
-            },
+    if NUTRITION_LOCAL == "first":
+        exercise_info = find_exercise(query, weight_kg, height_cm, age, sex)
+        if exercise_info is not None:
+            return exercise_info
+
+    try:
+        exercise_info = await exercise_flight.do(
+            (normalize_key(query), weight_kg, height_cm, age),
+            lambda: _fetch_exercise_info(query, weight_kg, height_cm, age)
         )
+    except Exception:
+        if NUTRITION_LOCAL != "fallback":
+            raise
+        logger.exception("Nutritionix недоступен")
+        exercise_info = None
 
-        try:
-            response.raise_for_status()
-        except httpx.HTTPStatusError:
-            if response.status_code == 404:
-                return None
+    if exercise_info is None and NUTRITION_LOCAL == "fallback":
+        return find_exercise(query, weight_kg, height_cm, age, sex)
+    return exercise_info
 
-        data = response.json()
-        if not data.get("exercises", []):
-            return None
-        return data["exercises"][0]
+
+async def _fetch_exercise_info(
+    query: str,
+    weight_kg: float,
+    height_cm: float,
+    age: int
+):
+    client = HttpClient.get_instance()
+    response = await client.post(
+        "https://trackapi.nutritionix.com/v2/natural/exercise",
+        headers={
+            "x-app-id": NUTRITIONIX_API_APP_ID,
+            "x-app-key": NUTRITIONIX_API_APP_KEY
+        },
+        json={
+            "query": query,
+            "weight_kg": weight_kg,
+            "height_cm": height_cm,
+            "age": age
+        },
+        timeout=HttpClient.timeout("nutritionix")
+    )
+
+    if response.status_code == 404:
+        return None
+
+    data = response.json()
+    if not data.get("exercises", []):
+        return None
+    return data["exercises"][0]
 
 
 def calculate_water_goal(
@@ -164,3 +339,25 @@ def calculate_calories_goal(
         calories_goal -= 161
     calories_goal += 12 * activity_minutes
     return int(calories_goal)
+
+
+def calculate_day_goals(profile, temperature: float) -> tuple[int, int]:
+    # Цели нового дня: по ним создают строку daily_stats /new_day
+    # и ночной перевод дня для всех пользователей
+    water_goal = calculate_water_goal(
+        profile.sex,
+        profile.weight_kg,
+        profile.activity_minutes,
+        temperature
+    )
+    calories_goal = (
+        profile.calories_goal_handle
+        or calculate_calories_goal(
+            profile.sex,
+            profile.weight_kg,
+            profile.height_cm,
+            profile.age,
+            profile.activity_minutes,
+        )
+    )
+    return water_goal, calories_goal
@@ -0,0 +1,97 @@
+import asyncio
+import multiprocessing as mp
+import signal
+from typing import Callable
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import (
+    SimpleRequestHandler,
+    setup_application
+)
+
+from config import (
+    WEBHOOK_BASE_URL,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_WORKERS,
+    logger
+)
+
+
+def create_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    # Тот же Dispatcher и роутер из handlers.py, что и при polling;
+    # startup/shutdown диспетчера вызываются при старте/остановке сервера
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET or None
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def set_webhook(bot: Bot):
+    # Без публичного адреса сервер можно проверять локально,
+    # отправляя POST-запросы с сохраненными обновлениями
+    if not WEBHOOK_BASE_URL:
+        logger.info("WEBHOOK_BASE_URL не задан, вебхук не регистрируется.")
+        return
+
+    async with bot.session:
+        await bot.set_webhook(
+            f"{WEBHOOK_BASE_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET or None
+        )
+    logger.info("Вебхук зарегистрирован.")
+
+
+def serve(dp: Dispatcher, bot: Bot, reuse_port: bool = False):
+    web.run_app(
+        create_app(dp, bot),
+        host=WEBHOOK_HOST,
+        port=WEBHOOK_PORT,
+        reuse_port=reuse_port,
+        print=None
+    )
+
+
+def run_webhook(bot: Bot, serve_worker: Callable[[bool, int], None]):
+    # serve_worker запускает сервер с Dispatcher и Bot модуля bot.py;
+    # в процессах-воркерах (spawn) он берет их из заново выполненного
+    # модуля запуска, а не импортирует bot повторно
+    asyncio.run(set_webhook(bot))
+
+    if WEBHOOK_WORKERS <= 1:
+        serve_worker(False)
+        return
+
+    # Несколько процессов слушают один порт (SO_REUSEPORT),
+    # ядро распределяет между ними входящие соединения
+    context = mp.get_context("spawn")
+    workers = [
+        context.Process(
+            target=serve_worker,
+            args=(True, i),
+            name=f"webhook-{i}"
+        )
+        for i in range(WEBHOOK_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info(f"Запущено процессов вебхука: {len(workers)}")
+
+    def stop_workers(*_):
+        # aiohttp обрабатывает SIGTERM штатно: дожидается запросов
+        # и вызывает shutdown диспетчера в каждом процессе
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+    for worker in workers:
+        worker.join()